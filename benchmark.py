@@ -0,0 +1,451 @@
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger('benchmark')
+
+# ====== 离线基准测试：合成RSS源 + 本地HTTP源服务 + 假大模型接口 + 本地SMTP接收端 ======
+
+FILLER_WORDS = [
+    'scalable', 'efficient', 'robust', 'framework', 'analysis', 'benchmark', 'towards',
+    'approach', 'method', 'dataset', 'evaluation', 'optimization', 'inference', 'training',
+    'sparse', 'adaptive', 'graph', 'latent', 'temporal', 'federated', 'causal', 'hierarchical',
+    'representation', 'retrieval', 'reasoning', 'alignment', 'distillation', 'compression',
+]
+
+DEFAULT_BENCH_KEYWORDS = ['LLM', 'Transformer', 'Diffusion', 'Deep Learning', 'Computer Vision']
+
+
+def _random_text(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def generate_corpus(feed_count=10, entry_count=100, abstract_size=1000, duplicate_ratio=0.1,
+                    match_ratio=0.3, keywords=None, seed=42, now=None):
+    rng = random.Random(seed)
+    keywords = keywords or DEFAULT_BENCH_KEYWORDS
+    now = now or datetime.now(timezone.utc)
+    generated = []
+    corpus = {}
+
+    for feed_idx in range(feed_count):
+        entries = []
+        for entry_idx in range(entry_count):
+            if generated and rng.random() < duplicate_ratio:
+                entries.append(rng.choice(generated))
+                continue
+            title = _random_text(rng, 60).title()
+            if rng.random() < match_ratio:
+                title = f"{rng.choice(keywords)} {title}"
+            entry = {
+                'title': title,
+                'link': f"https://bench.invalid/paper/{feed_idx}/{entry_idx}",
+                'abstract': f"<p>{_random_text(rng, abstract_size)}</p>",
+                'published': now - timedelta(minutes=rng.randint(1, 12 * 60)),
+            }
+            entries.append(entry)
+            generated.append(entry)
+
+        if feed_idx % 2 == 0:
+            corpus[f"/feeds/{feed_idx}.rss"] = _render_rss(feed_idx, entries)
+        else:
+            corpus[f"/feeds/{feed_idx}.atom"] = _render_atom(feed_idx, entries)
+    return corpus
+
+
+def _render_rss(feed_idx, entries):
+    items = []
+    for entry in entries:
+        items.append(
+            "<item>"
+            f"<title>{escape(entry['title'])}</title>"
+            f"<link>{escape(entry['link'])}</link>"
+            f"<guid>{escape(entry['link'])}</guid>"
+            f"<description>{escape(entry['abstract'])}</description>"
+            f"<pubDate>{format_datetime(entry['published'])}</pubDate>"
+            "</item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0"><channel>'
+        f"<title>Bench Feed {feed_idx}</title>"
+        f"<link>https://bench.invalid/{feed_idx}</link>"
+        "<description>synthetic</description>"
+        + ''.join(items) +
+        "</channel></rss>"
+    ).encode('utf-8')
+
+
+def _render_atom(feed_idx, entries):
+    items = []
+    for entry in entries:
+        items.append(
+            "<entry>"
+            f"<title>{escape(entry['title'])}</title>"
+            f"<link href=\"{escape(entry['link'])}\"/>"
+            f"<id>{escape(entry['link'])}</id>"
+            f"<published>{entry['published'].isoformat()}</published>"
+            f"<updated>{entry['published'].isoformat()}</updated>"
+            f"<summary type=\"html\">{escape(entry['abstract'])}</summary>"
+            "</entry>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f"<title>Bench Feed {feed_idx}</title>"
+        f"<id>https://bench.invalid/{feed_idx}</id>"
+        f"<updated>{datetime.now(timezone.utc).isoformat()}</updated>"
+        + ''.join(items) +
+        "</feed>"
+    ).encode('utf-8')
+
+
+def _start_http_server(handler_cls):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_cls)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_feed_server(corpus, latency=0.0):
+    class FeedHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = corpus.get(self.path.split('?', 1)[0])
+            if latency:
+                time.sleep(latency)
+            if body is None:
+                self.send_error(404)
+                return
+            content_type = 'application/atom+xml' if self.path.endswith('.atom') else 'application/rss+xml'
+            self.send_response(200)
+            self.send_header('Content-Type', f"{content_type}; charset=utf-8")
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return _start_http_server(FeedHandler)
+
+
+def start_fake_llm_server(latency=0.0):
+    stats = {'requests': 0}
+    lock = threading.Lock()
+
+    class ChatHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self.send_error(404)
+                return
+            if latency:
+                time.sleep(latency)
+            with lock:
+                stats['requests'] += 1
+
+            prompt = '\n'.join(m.get('content', '') for m in payload.get('messages', []))
+            titles = [line.split('标题:', 1)[1].strip() for line in prompt.splitlines() if '标题:' in line]
+            content = "AI前沿：基准测试摘要\n---\n" + '\n'.join(
+                f"{i}. {title}" for i, title in enumerate(titles, 1)
+            )
+            prompt_tokens = len(prompt) // 4
+            completion_tokens = len(content) // 4
+            body = json.dumps({
+                'id': f"bench-{stats['requests']}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': payload.get('model', 'bench'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                },
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = _start_http_server(ChatHandler)
+    server.stats = stats
+    return server
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self._reply('220 bench-smtp ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().split(' ', 1)[0].upper()
+            if command == 'EHLO':
+                self.wfile.write(b'250-bench-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+            elif command == 'AUTH':
+                self._reply('235 authenticated')
+            elif command == 'DATA':
+                self._reply('354 end with <CRLF>.<CRLF>')
+                size = 0
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data_line)
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                with self.server.lock:
+                    self.server.messages += 1
+                    self.server.bytes += size
+                self._reply('250 queued')
+            elif command == 'QUIT':
+                self._reply('221 bye')
+                return
+            elif command in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 ok')
+            else:
+                self._reply('502 not implemented')
+
+
+def start_smtp_sink(latency=0.0):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPSinkHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.messages = 0
+    server.bytes = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ====== 统计 ======
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss / (1024 * 1024)
+    return rss / 1024
+
+
+def collect_samples(metrics):
+    samples = {}
+    original_observe = metrics.observe
+
+    def observe(name, value, **labels):
+        key = name
+        if 'op' in labels:
+            key = f"{name}{{op={labels['op']}}}"
+        elif 'job' in labels:
+            key = f"{name}{{job={labels['job']}}}"
+        samples.setdefault(key, []).append(value)
+        original_observe(name, value, **labels)
+
+    metrics.observe = observe
+    return samples
+
+
+def run_benchmark(args):
+    keywords = DEFAULT_BENCH_KEYWORDS
+    corpus = generate_corpus(
+        feed_count=args.feeds,
+        entry_count=args.entries,
+        abstract_size=args.abstract_size,
+        duplicate_ratio=args.duplicate_ratio,
+        match_ratio=args.match_ratio,
+        keywords=keywords,
+        seed=args.seed,
+    )
+    corpus_bytes = sum(len(v) for v in corpus.values())
+
+    feed_server = start_feed_server(corpus, latency=args.feed_latency)
+    llm_server = start_fake_llm_server(latency=args.llm_latency)
+    smtp_server = start_smtp_sink(latency=args.smtp_latency)
+
+    workdir = tempfile.mkdtemp(prefix='aipaperpush-bench-')
+    keywords_path = os.path.join(workdir, 'keywords.txt')
+    with open(keywords_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(keywords) + '\n')
+
+    # fetch_and_push 在导入时读取这些环境变量，必须先于导入设置
+    os.environ['DB_PATH'] = os.path.join(workdir, 'papers.db')
+    os.environ['EMAIL_NOTIFIER'] = (
+        f"mailto://127.0.0.1:{smtp_server.server_address[1]}"
+        "?from=bench@bench.invalid&to=digest@bench.invalid"
+    )
+    os.environ['MAIL_RETRY'] = '1'
+    os.environ['BATCH_SEND_DELAY'] = str(args.batch_delay)
+    os.environ['NEW_ITEM_THRESHOLD_HOURS'] = '24'
+    if args.no_llm:
+        os.environ['DOUBAO_API_KEY'] = ''
+    else:
+        os.environ['DOUBAO_API_KEY'] = 'bench'
+        os.environ['DOUBAO_ENDPOINT'] = f"http://127.0.0.1:{llm_server.server_address[1]}/api/v3"
+        os.environ['DOUBAO_MODEL'] = 'bench-model'
+
+    import fetch_and_push as fap
+
+    base_url = f"http://127.0.0.1:{feed_server.server_address[1]}"
+    fap.RSS_FEEDS = [base_url + path for path in corpus]
+    fap.KEYWORDS_FILE = keywords_path
+    fap.ensure_db_dir()
+    fap.init_db()
+    samples = collect_samples(fap.METRICS)
+
+    start = time.perf_counter()
+    fap.fetch_and_push()
+    fetch_seconds = time.perf_counter() - start
+    rss_after_fetch = peak_rss_mb()
+
+    with fap.DatabaseConnection() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM papers WHERE sent = 0")
+        backlog = cursor.fetchone()[0]
+
+    start = time.perf_counter()
+    fap.ai_integrated_batch_send()
+    send_seconds = time.perf_counter() - start
+
+    total_entries = args.feeds * args.entries
+    result = {
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'verbose')},
+        'corpus_bytes': corpus_bytes,
+        'fetch_seconds': fetch_seconds,
+        'fetch_entries_per_sec': total_entries / fetch_seconds if fetch_seconds else None,
+        'stored_articles': backlog,
+        'send_seconds': send_seconds,
+        'send_articles_per_sec': backlog / send_seconds if send_seconds and backlog else None,
+        'emails_received': smtp_server.messages,
+        'llm_requests': llm_server.stats['requests'],
+        'peak_rss_mb_after_fetch': rss_after_fetch,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {
+            name: {
+                'count': len(values),
+                'p50': percentile(values, 50),
+                'p99': percentile(values, 99),
+            }
+            for name, values in sorted(samples.items())
+        },
+    }
+
+    feed_server.shutdown()
+    llm_server.shutdown()
+    smtp_server.shutdown()
+    return result
+
+
+def _format_value(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return str(value)
+
+
+def print_report(result, baseline=None):
+    headline = [
+        'fetch_seconds', 'fetch_entries_per_sec', 'stored_articles', 'send_seconds',
+        'send_articles_per_sec', 'emails_received', 'llm_requests', 'peak_rss_mb',
+    ]
+    print("=== 基准测试结果 ===")
+    for key in headline:
+        line = f"{key:<26} {_format_value(result.get(key)):>14}"
+        if baseline and isinstance(baseline.get(key), (int, float)) and isinstance(result.get(key), (int, float)) and baseline[key]:
+            delta = (result[key] - baseline[key]) / baseline[key] * 100
+            line += f"   基线 {_format_value(baseline[key]):>12} ({delta:+.1f}%)"
+        print(line)
+
+    print("\n=== 各阶段耗时（秒）===")
+    print(f"{'stage':<52} {'count':>7} {'p50':>10} {'p99':>10}")
+    base_stages = (baseline or {}).get('stages', {})
+    for name, stats in result['stages'].items():
+        line = f"{name:<52} {stats['count']:>7} {_format_value(stats['p50']):>10} {_format_value(stats['p99']):>10}"
+        base = base_stages.get(name)
+        if base and base.get('p50') and stats['p50'] is not None:
+            line += f"   p50 {(stats['p50'] - base['p50']) / base['p50'] * 100:+.1f}%"
+        print(line)
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(description='离线端到端基准测试：不依赖外网、豆包API和真实邮箱')
+    arg_parser.add_argument('--feeds', type=int, default=10, help='合成RSS源数量')
+    arg_parser.add_argument('--entries', type=int, default=100, help='每个RSS源的条目数')
+    arg_parser.add_argument('--abstract-size', type=int, default=1000, help='摘要长度（字符）')
+    arg_parser.add_argument('--duplicate-ratio', type=float, default=0.1, help='跨源重复条目比例')
+    arg_parser.add_argument('--match-ratio', type=float, default=0.3, help='标题命中关键词的比例')
+    arg_parser.add_argument('--feed-latency', type=float, default=0.0, help='RSS源服务响应延迟（秒）')
+    arg_parser.add_argument('--llm-latency', type=float, default=0.0, help='假大模型接口响应延迟（秒）')
+    arg_parser.add_argument('--smtp-latency', type=float, default=0.0, help='SMTP接收端每封邮件延迟（秒）')
+    arg_parser.add_argument('--batch-delay', type=float, default=0.0, help='批次间发送间隔（秒），对应 BATCH_SEND_DELAY')
+    arg_parser.add_argument('--no-llm', action='store_true', help='不配置大模型，测试传统发送路径')
+    arg_parser.add_argument('--seed', type=int, default=42, help='语料随机种子')
+    arg_parser.add_argument('--output', help='将结果写入JSON文件')
+    arg_parser.add_argument('--baseline', help='与之前保存的JSON结果对比')
+    arg_parser.add_argument('--verbose', action='store_true', help='输出应用日志')
+    return arg_parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    result = run_benchmark(args)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
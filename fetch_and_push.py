@@ -1,10 +1,4 @@
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-import feedparser
 import sqlite3
-import apprise
-import schedule
 import time
 import os
 import json
@@ -12,40 +6,79 @@ import logging
 import re
 import sys
 import hashlib
-from datetime import datetime, timezone
-from dateutil import parser
-from logging.handlers import RotatingFileHandler
+import signal
+import argparse
+import threading
+import functools
+import atexit
+import queue
+import socket
+import gzip
+import collections
+import email.utils
+from datetime import datetime, timedelta, timezone
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+import feedparser
 import requests
-import json
+from dateutil import parser
 from requests.exceptions import RequestException
-import time
-import hashlib
-import signal
-from volcenginesdkarkruntime import Ark
 
-log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(log_formatter)
-console_handler.setLevel(logging.INFO)
+_log_listener = None
 
-file_handler = RotatingFileHandler(
-    'app.log', maxBytes=1024*1024*1, backupCount=5,
-    encoding='utf-8'
-)
-file_handler.setFormatter(log_formatter)
-file_handler.setLevel(logging.DEBUG)
+LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', '5'))
 
-log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
-level = getattr(logging, log_level, logging.INFO)
 
-logging.basicConfig(
-    level=level,
-    handlers=[console_handler, file_handler]
-)
+def setup_logging():
+    global _log_listener
+    if _log_listener is not None:
+        return
+    log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-logging.info(f"日志级别设置为: {log_level}")
-logger = logging.getLogger(__name__)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(log_formatter)
+    console_handler.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(log_formatter)
+    file_handler.setLevel(logging.DEBUG)
+
+    log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    level = getattr(logging, log_level, logging.INFO)
+
+    # 业务线程只负责入队，控制台和文件写入由后台监听线程完成
+    log_queue = queue.SimpleQueue()
+    _log_listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logging)
+
+    queue_handler = QueueHandler(log_queue)
+    # 入队时只合并消息与异常信息，最终格式由监听线程中的处理器决定
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
+    logging.basicConfig(
+        level=level,
+        handlers=[queue_handler]
+    )
+
+    logging.info(f"日志级别设置为: {log_level}")
+
+def stop_logging():
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+def log_summary(kind, **fields):
+    logger.info(f"{kind}: {json.dumps(fields, ensure_ascii=False, sort_keys=True, default=str)}")
 
 # ====== 配置部分 ======RSS
 RSS_FEEDS = [
@@ -67,11 +100,73 @@ KEYWORDS_FILE = "keywords.txt"
 # 新文章时间阈值（小时），默认为24小时
 NEW_ITEM_THRESHOLD_HOURS = int(os.environ.get('NEW_ITEM_THRESHOLD_HOURS', '24'))
 
+# 关键词是否同时匹配摘要，默认仅匹配标题
+MATCH_ABSTRACT = os.environ.get('MATCH_ABSTRACT', 'false').lower() in ('1', 'true', 'yes')
+
+# keywords.txt 变更后自动回溯匹配的天数，0 表示不自动回溯
+KEYWORD_BACKFILL_DAYS = int(os.environ.get('KEYWORD_BACKFILL_DAYS', '7'))
+
+# 每期推送最多包含的文章数（按BM25相关性得分取前K篇），0 表示不限制
+DIGEST_TOP_K = int(os.environ.get('DIGEST_TOP_K', '0'))
+
 NOTIFIERS = [n for n in [os.environ.get('EMAIL_NOTIFIER', '').strip()] if n]
 
-for notifier in NOTIFIERS:
-    if notifier.startswith('mailto://') and 'http://' in notifier:
-        logging.warning(f"可能的协议错误: {notifier} 应使用 smtp:// 而非 http://")
+# ====== 多工作进程租约配置 ======
+
+# 多个进程/节点共享同一数据库时开启，各进程通过租约认领RSS源，避免重复抓取
+FEED_LEASES = os.environ.get('FEED_LEASES', 'false').lower() in ('1', 'true', 'yes')
+WORKER_ID = os.environ.get('WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+# 租约持有者标识：WORKER_ID 在重启后会被复用（固定配置或容器内相同的 主机名:进程号），
+# 加上每个进程唯一的后缀，避免新进程续约崩溃进程遗留的租约
+LEASE_OWNER = f"{WORKER_ID}#{os.urandom(4).hex()}"
+# 租约有效期（秒），持有期间由后台线程按 1/3 有效期续约，进程崩溃后租约过期即可被其他进程接管
+FEED_LEASE_TTL = int(os.environ.get('FEED_LEASE_TTL', '300'))
+# 同一RSS源两次抓取的最小间隔（秒），防止多个进程在同一轮中重复抓取；启用自适应调度时改用各源自身的下次抓取时间
+FEED_REFRESH_INTERVAL = int(os.environ.get('FEED_REFRESH_INTERVAL', '3300'))
+
+# ====== 自适应抓取调度配置 ======
+
+# 按各RSS源的历史发布规律和HTTP缓存命中情况调整抓取间隔，关闭后每小时抓取全部源
+ADAPTIVE_POLLING = os.environ.get('ADAPTIVE_POLLING', 'true').lower() in ('1', 'true', 'yes')
+# 抓取间隔的上下限（秒），预计更新时间附近按下限频繁抓取
+FEED_MIN_POLL_INTERVAL = int(os.environ.get('FEED_MIN_POLL_INTERVAL', '900'))
+FEED_MAX_POLL_INTERVAL = int(os.environ.get('FEED_MAX_POLL_INTERVAL', '43200'))
+# 尚未学到发布规律的RSS源的初始抓取间隔（秒），连续无更新时逐步翻倍
+FEED_DEFAULT_POLL_INTERVAL = int(os.environ.get('FEED_DEFAULT_POLL_INTERVAL', '3600'))
+# 守护进程检查到期RSS源的间隔（秒）
+FEED_SCHEDULER_TICK = int(os.environ.get('FEED_SCHEDULER_TICK', '300'))
+# 发布时间相差不超过该秒数的条目视为同一批更新
+FEED_BURST_WINDOW = 1800
+# 每个RSS源保留的历史发布时间数量
+FEED_PUBLISH_HISTORY = 200
+# 每个RSS源保留的实际观测到更新（抓取到新条目）的记录数量
+FEED_CHANGE_HISTORY = 30
+
+# ====== 数据保留与维护配置 ======
+
+# 已发送文章及抓取条目的保留天数，超出后归档为压缩JSONL并从数据库删除，0 表示永久保留
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', '0'))
+# 归档目录，默认为数据库所在目录下的 archive
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', '').strip()
+# 为 false 时超出保留期的数据直接删除，不写归档
+ARCHIVE_BEFORE_DELETE = os.environ.get('ARCHIVE_BEFORE_DELETE', 'true').lower() in ('1', 'true', 'yes')
+# 每日维护任务（归档清理、增量VACUUM、统计信息更新）的执行时间，本地时间 HH:MM
+MAINTENANCE_TIME = os.environ.get('MAINTENANCE_TIME', '03:30')
+# 完整 ANALYZE 的间隔天数，其余维护只执行 PRAGMA optimize
+ANALYZE_INTERVAL_DAYS = 7
+# 归档清理时每个事务处理的行数
+RETENTION_CHUNK_SIZE = 5000
+# WAL 文件在检查点后保留的最大字节数
+WAL_SIZE_LIMIT = 64 * 1024 * 1024
+
+# ====== RSS原始快照配置 ======
+
+# 保存每次抓取到的RSS原始响应（按内容哈希去重、gzip压缩），可通过 reprocess 子命令离线重新处理
+FEED_SNAPSHOTS = os.environ.get('FEED_SNAPSHOTS', 'false').lower() in ('1', 'true', 'yes')
+# 快照目录，默认为数据库所在目录下的 snapshots
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '').strip()
+# 快照保留天数，由每日维护任务清理，0 表示永久保留
+SNAPSHOT_RETENTION_DAYS = int(os.environ.get('SNAPSHOT_RETENTION_DAYS', '14'))
 
 
 # ====== 豆包大模型配置 ======
@@ -80,9 +175,18 @@ DOUBAO_API_KEY = os.environ.get('DOUBAO_API_KEY', '')
 DOUBAO_ENDPOINT = os.environ.get('DOUBAO_ENDPOINT', '')
 DOUBAO_MODEL = os.environ.get('DOUBAO_MODEL', '') 
 
-if not DOUBAO_API_KEY:
-    logger.warning("未配置豆包大模型API密钥，将使用传统单篇发送模式")
-    logger.warning("请设置环境变量 DOUBAO_API_KEY 以启用AI整合功能")
+# 批次之间的发送间隔（秒），避免触发邮件服务器频率限制
+BATCH_SEND_DELAY = float(os.environ.get('BATCH_SEND_DELAY', '2'))
+
+
+def check_config():
+    for notifier in NOTIFIERS:
+        if notifier.startswith('mailto://') and 'http://' in notifier:
+            logging.warning(f"可能的协议错误: {notifier} 应使用 smtp:// 而非 http://")
+
+    if not DOUBAO_API_KEY:
+        logger.warning("未配置豆包大模型API密钥，将使用传统单篇发送模式")
+        logger.warning("请设置环境变量 DOUBAO_API_KEY 以启用AI整合功能")
 
 
 def load_keywords():
@@ -100,49 +204,52 @@ if not DB_PATH:
         DB_PATH = '/app/data/papers.db'
     else:
         DB_PATH = os.path.join(os.getcwd(), 'papers.db')
-logger.info(f"数据库路径: {DB_PATH}")
 
 
-db_dir = os.path.dirname(DB_PATH)
-if db_dir and not os.path.exists(db_dir):
-    os.makedirs(db_dir, exist_ok=True)
-    logger.info(f"创建数据库目录: {db_dir}")
+def ensure_db_dir():
+    import stat
 
+    logger.info(f"数据库路径: {DB_PATH}")
+    db_dir = os.path.dirname(DB_PATH)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+        logger.info(f"创建数据库目录: {db_dir}")
 
-if db_dir:
-    try:
-        import stat
-        os.chmod(db_dir, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
-        logger.info(f"已设置数据库目录权限: {db_dir}")
-    except Exception as dir_perm_e:
-        logger.warning(f"设置数据库目录权限失败: {str(dir_perm_e)}")
+    if db_dir:
         try:
-            os.chmod(db_dir, 0o755)  
-            logger.info(f"已使用备用权限设置数据库目录: {db_dir}")
-        except Exception as dir_perm_e2:
-            logger.warning(f"备用目录权限设置也失败: {str(dir_perm_e2)}")
-
+            os.chmod(db_dir, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
+            logger.info(f"已设置数据库目录权限: {db_dir}")
+        except Exception as dir_perm_e:
+            logger.warning(f"设置数据库目录权限失败: {str(dir_perm_e)}")
+            try:
+                os.chmod(db_dir, 0o755)  
+                logger.info(f"已使用备用权限设置数据库目录: {db_dir}")
+            except Exception as dir_perm_e2:
+                logger.warning(f"备用目录权限设置也失败: {str(dir_perm_e2)}")
 
-if not os.access(db_dir, os.W_OK):
-    logger.error(f"数据库目录不可写: {db_dir}")
-    logger.error("尝试修复目录权限...")
-    try:
-        os.chmod(db_dir, 0o777)  # 最宽松的权限设置
-        logger.info(f"已使用最宽松权限设置目录: {db_dir}")
-        if not os.access(db_dir, os.W_OK):
-            raise PermissionError(f"即使设置最宽松权限后，目录仍不可写: {db_dir}")
-    except Exception as final_perm_e:
-        logger.error(f"最终权限修复失败: {str(final_perm_e)}")
-        raise PermissionError(f"无法写入数据库目录: {db_dir}")
+    if not os.access(db_dir or '.', os.W_OK):
+        logger.error(f"数据库目录不可写: {db_dir}")
+        logger.error("尝试修复目录权限...")
+        try:
+            os.chmod(db_dir, 0o777)  # 最宽松的权限设置
+            logger.info(f"已使用最宽松权限设置目录: {db_dir}")
+            if not os.access(db_dir, os.W_OK):
+                raise PermissionError(f"即使设置最宽松权限后，目录仍不可写: {db_dir}")
+        except Exception as final_perm_e:
+            logger.error(f"最终权限修复失败: {str(final_perm_e)}")
+            raise PermissionError(f"无法写入数据库目录: {db_dir}")
 
 
 class DatabaseConnection:
     def __enter__(self):
         self.conn = sqlite3.connect(DB_PATH, timeout=30)
         try:
+            # 需在切换 WAL 前设置，仅对新建的数据库文件生效；已有数据库由维护任务通过一次 VACUUM 转换
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
             self.conn.execute("PRAGMA journal_mode=WAL;")
             self.conn.execute("PRAGMA synchronous=NORMAL;")
             self.conn.execute("PRAGMA busy_timeout=5000;")
+            self.conn.execute(f"PRAGMA journal_size_limit={WAL_SIZE_LIMIT};")
         except Exception:
             pass
         self.cursor = self.conn.cursor()
@@ -157,53 +264,783 @@ class DatabaseConnection:
         self.conn.close()
 
 
-logger.info(f"尝试连接数据库: {DB_PATH}")
-max_retries = 5
-retry_delay = 2  
-retry_count = 0
-success = False
-while retry_count < max_retries and not success:
-    try:
-        with DatabaseConnection() as cursor:
-            cursor.execute('''CREATE TABLE IF NOT EXISTS papers
-                         (id TEXT PRIMARY KEY, title TEXT, link TEXT, published_time DATETIME, sent INTEGER DEFAULT 0, abstract TEXT)''')
-            logger.info("数据库表结构初始化成功")
-            if os.path.exists(DB_PATH):
-                logger.info(f"数据库文件已成功创建: {DB_PATH}")
-                logger.info(f"文件大小: {os.path.getsize(DB_PATH)} bytes")
-                
-                try:
-                    import stat
-                    os.chmod(DB_PATH, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
-                    logger.info(f"已设置数据库文件权限: {DB_PATH}")
-                except Exception as perm_e:
-                    logger.warning(f"设置数据库文件权限失败: {str(perm_e)}")
+def ensure_columns(cursor, table, columns):
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, definition in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            logger.info(f"数据库表 {table} 已添加字段: {name}")
+
+
+def create_schema(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS papers
+                 (id TEXT PRIMARY KEY, title TEXT, link TEXT, published_time DATETIME, sent INTEGER DEFAULT 0, abstract TEXT,
+                  score REAL)''')
+    # 兼容早期只有 id/title/link 三列的数据库文件
+    ensure_columns(cursor, 'papers', [
+        ('published_time', 'DATETIME'),
+        ('sent', 'INTEGER DEFAULT 0'),
+        ('abstract', 'TEXT'),
+        ('score', 'REAL'),
+    ])
+
+    # entries 保存抓取到的全部条目（不论是否命中关键词），entries_fts 为其标题和摘要的全文索引
+    cursor.execute('''CREATE TABLE IF NOT EXISTS entries
+                 (id TEXT PRIMARY KEY, title TEXT, link TEXT, published_time DATETIME, abstract TEXT,
+                  feed_url TEXT, fetched_at DATETIME)''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entries_published ON entries (published_time)")
+    cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5
+                 (title, abstract, content='entries', content_rowid='rowid')''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+                     INSERT INTO entries_fts (rowid, title, abstract) VALUES (new.rowid, new.title, new.abstract);
+                 END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+                     INSERT INTO entries_fts (entries_fts, rowid, title, abstract) VALUES ('delete', old.rowid, old.title, old.abstract);
+                 END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries BEGIN
+                     INSERT INTO entries_fts (entries_fts, rowid, title, abstract) VALUES ('delete', old.rowid, old.title, old.abstract);
+                     INSERT INTO entries_fts (rowid, title, abstract) VALUES (new.rowid, new.title, new.abstract);
+                 END''')
+
+    cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    # 租约表：name 为 feed:<url> 或 job:<任务名>，时间字段均为 Unix 时间戳
+    cursor.execute('''CREATE TABLE IF NOT EXISTS leases
+                 (name TEXT PRIMARY KEY, owner TEXT, acquired_at REAL, renewed_at REAL, expires_at REAL,
+                  last_completed_at REAL, next_due_at REAL)''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_leases_owner ON leases (owner)")
+
+    # 自适应抓取调度状态：HTTP缓存校验头、历史发布时间与观测到更新的时间（JSON数组）及下次抓取时间，
+    # 时间字段均为 Unix 时间戳
+    cursor.execute('''CREATE TABLE IF NOT EXISTS feed_state
+                 (feed_url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, publish_times TEXT,
+                  last_polled_at REAL, last_changed_at REAL, next_poll_at REAL, poll_interval REAL,
+                  unchanged_polls INTEGER DEFAULT 0, failures INTEGER DEFAULT 0, override_interval REAL,
+                  change_times TEXT)''')
+    ensure_columns(cursor, 'feed_state', [('change_times', 'TEXT')])
+
+    # RSS原始快照索引：内容按 sha256 存放在快照目录中，同一源的相同内容只记录一行
+    cursor.execute('''CREATE TABLE IF NOT EXISTS feed_snapshots
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT, feed_url TEXT NOT NULL, sha256 TEXT NOT NULL, size INTEGER,
+                  headers TEXT, first_seen_at REAL, last_seen_at REAL, UNIQUE (feed_url, sha256))''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_feed_snapshots_seen ON feed_snapshots (last_seen_at)")
+
+    # 订阅者及其关键词；subscriber_keywords 按关键词建立索引，作为关键词到订阅者的倒排表
+    cursor.execute('''CREATE TABLE IF NOT EXISTS subscribers
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, notifier TEXT NOT NULL,
+                  frequency TEXT DEFAULT 'daily', enabled INTEGER DEFAULT 1, created_at DATETIME, last_sent_at DATETIME)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS subscriber_keywords
+                 (subscriber_id INTEGER NOT NULL, keyword TEXT NOT NULL, PRIMARY KEY (subscriber_id, keyword))''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_subscriber_keywords_keyword ON subscriber_keywords (keyword)")
+    cursor.execute('''CREATE TABLE IF NOT EXISTS subscriber_matches
+                 (subscriber_id INTEGER NOT NULL, entry_id TEXT NOT NULL, matched_at DATETIME, sent INTEGER DEFAULT 0,
+                  score REAL, PRIMARY KEY (subscriber_id, entry_id))''')
+    ensure_columns(cursor, 'subscriber_matches', [('score', 'REAL')])
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_subscriber_matches_unsent ON subscriber_matches (subscriber_id, sent)")
+
+    # 升级前已入库的文章同步写入 entries，使其可被重新匹配
+    cursor.execute("SELECT value FROM meta WHERE key = 'entries_seeded'")
+    if cursor.fetchone() is None:
+        cursor.execute('''INSERT OR IGNORE INTO entries (id, title, link, published_time, abstract)
+                     SELECT id, title, link, published_time, abstract FROM papers''')
+        cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('entries_seeded', '1')")
+
+
+def get_meta(cursor, key, default=None):
+    cursor.execute("SELECT value FROM meta WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    return row[0] if row else default
+
+
+def set_meta(cursor, key, value):
+    cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def init_db(max_retries=5, retry_delay=2):
+    import stat
+
+    logger.info(f"尝试连接数据库: {DB_PATH}")
+    retry_count = 0
+    success = False
+    while retry_count < max_retries and not success:
+        try:
+            with DatabaseConnection() as cursor:
+                create_schema(cursor)
+                logger.info("数据库表结构初始化成功")
+                if os.path.exists(DB_PATH):
+                    logger.info(f"数据库文件已成功创建: {DB_PATH}")
+                    logger.info(f"文件大小: {os.path.getsize(DB_PATH)} bytes")
+                    
                     try:
-                        os.chmod(DB_PATH, 0o666)  
-                        logger.info(f"已使用备用权限设置数据库文件: {DB_PATH}")
-                    except Exception as perm_e2:
-                        logger.warning(f"备用权限设置也失败: {str(perm_e2)}")
+                        os.chmod(DB_PATH, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+                        logger.info(f"已设置数据库文件权限: {DB_PATH}")
+                    except Exception as perm_e:
+                        logger.warning(f"设置数据库文件权限失败: {str(perm_e)}")
+                        try:
+                            os.chmod(DB_PATH, 0o666)  
+                            logger.info(f"已使用备用权限设置数据库文件: {DB_PATH}")
+                        except Exception as perm_e2:
+                            logger.warning(f"备用权限设置也失败: {str(perm_e2)}")
+                else:
+                    logger.error(f"数据库文件创建失败，路径: {DB_PATH}")
+            success = True
+        except sqlite3.OperationalError as e:
+            if "database is locked" in str(e):
+                retry_count += 1
+                if retry_count >= max_retries:
+                    logger.error(f"数据库锁定错误，已达到最大重试次数 {max_retries}")
+                    raise
+                logger.warning(f"数据库锁定，正在重试 ({retry_count}/{max_retries})...")
+                time.sleep(retry_delay)
             else:
-                logger.error(f"数据库文件创建失败，路径: {DB_PATH}")
-        success = True
-    except sqlite3.OperationalError as e:
-        if "database is locked" in str(e):
-            retry_count += 1
-            if retry_count >= max_retries:
-                logger.error(f"数据库锁定错误，已达到最大重试次数 {max_retries}")
+                logger.error(f"数据库操作错误: {str(e)}", exc_info=True)
                 raise
-            logger.warning(f"数据库锁定，正在重试 ({retry_count}/{max_retries})...")
-            time.sleep(retry_delay)
-        else:
-            logger.error(f"数据库操作错误: {str(e)}", exc_info=True)
+        except Exception as e:
+            logger.error(f"数据库初始化失败: {str(e)}", exc_info=True)
             raise
+    if not success:
+        raise Exception("数据库初始化失败，已达到最大重试次数")
+
+
+def bootstrap():
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    setup_logging()
+    check_config()
+    ensure_db_dir()
+    init_db()
+    if FEED_LEASES:
+        release_stale_leases()
+
+
+# ====== 监控指标 ======
+
+# 本地指标暴露端口，为空时不启动HTTP端点
+METRICS_PORT = os.environ.get('METRICS_PORT', '').strip()
+METRICS_BIND = os.environ.get('METRICS_BIND', '127.0.0.1')
+# node_exporter textfile collector 输出路径，为空时不写文件
+METRICS_TEXTFILE = os.environ.get('METRICS_TEXTFILE', '').strip()
+
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+METRIC_DEFINITIONS = {
+    'aipaperpush_job_duration_seconds': ('histogram', '任务整体耗时'),
+    'aipaperpush_job_last_run_timestamp_seconds': ('gauge', '任务最近一次结束时间'),
+    'aipaperpush_feed_fetch_seconds': ('histogram', 'RSS源下载耗时'),
+    'aipaperpush_feed_fetch_total': ('counter', 'RSS源下载次数（按状态码）'),
+    'aipaperpush_feed_fetch_bytes_total': ('counter', 'RSS源下载字节数'),
+    'aipaperpush_feed_parse_seconds': ('histogram', 'RSS源解析耗时'),
+    'aipaperpush_feed_entries_total': ('counter', 'RSS源条目数（按过滤结果）'),
+    'aipaperpush_db_write_seconds': ('histogram', '数据库写入耗时'),
+    'aipaperpush_llm_call_seconds': ('histogram', '大模型调用耗时'),
+    'aipaperpush_llm_calls_total': ('counter', '大模型调用次数（按结果）'),
+    'aipaperpush_llm_tokens_total': ('counter', '大模型token用量'),
+    'aipaperpush_smtp_send_seconds': ('histogram', '单次邮件发送耗时'),
+    'aipaperpush_smtp_attempts_total': ('counter', '邮件发送尝试次数（按结果）'),
+    'aipaperpush_smtp_retries_total': ('counter', '邮件发送重试次数'),
+    'aipaperpush_backlog_unsent': ('gauge', '待发送文章数量 (sent = 0)'),
+    'aipaperpush_subscriber_matches_total': ('counter', '订阅者匹配条目数'),
+    'aipaperpush_subscriber_backlog_unsent': ('gauge', '各订阅者待发送文章数量'),
+    'aipaperpush_lease_claims_total': ('counter', '租约认领次数（按结果）'),
+    'aipaperpush_feed_polls_total': ('counter', 'RSS源抓取次数（按结果：changed/unchanged/not_modified/error）'),
+    'aipaperpush_feed_poll_interval_seconds': ('gauge', '各RSS源当前的抓取间隔'),
+    'aipaperpush_score_seconds': ('histogram', '单批相关性评分耗时'),
+    'aipaperpush_scored_entries_total': ('counter', '已评分的待发送文章数'),
+    'aipaperpush_digest_capped_total': ('counter', '因超出每期上限而未推送的文章数'),
+    'aipaperpush_retention_deleted_total': ('counter', '超出保留期被归档删除的行数'),
+    'aipaperpush_db_size_bytes': ('gauge', '数据库文件大小（db/wal）'),
+    'aipaperpush_snapshot_writes_total': ('counter', 'RSS原始快照写入次数（按结果：stored/deduplicated）'),
+}
+
+
+class Metrics:
+    def __init__(self, definitions, buckets=METRIC_BUCKETS):
+        self.definitions = definitions
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.values = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def timer(self, name, **labels):
+        return _MetricTimer(self, name, labels)
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = []
+        for k, v in pairs:
+            v = v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{k}="{v}"')
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        with self.lock:
+            values = dict(self.values)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self.histograms.items()}
+
+        lines = []
+        for name, (metric_type, help_text) in self.definitions.items():
+            series = [(labels, v) for (n, labels), v in values.items() if n == name]
+            hist_series = [(labels, v) for (n, labels), v in histograms.items() if n == name]
+            if not series and not hist_series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(series):
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for labels, (counts, total, count) in sorted(hist_series):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{name}_bucket{self._format_labels(labels, [('le', str(bound))])} {bucket_count}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+class _MetricTimer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, self.elapsed, **self.labels)
+
+
+METRICS = Metrics(METRIC_DEFINITIONS)
+
+
+def start_metrics_server(port, bind=METRICS_BIND):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            payload = METRICS.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logger.debug(f"指标请求: {self.address_string()} {format % args}")
+
+    server = ThreadingHTTPServer((bind, int(port)), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    logger.info(f"指标端点已启动: http://{bind}:{port}/metrics")
+    return server
+
+
+def record_backlog_size():
+    try:
+        with DatabaseConnection() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM papers WHERE sent = 0")
+            METRICS.set('aipaperpush_backlog_unsent', cursor.fetchone()[0])
+            cursor.execute('''SELECT s.name, COUNT(m.entry_id) FROM subscribers s
+                              LEFT JOIN subscriber_matches m ON m.subscriber_id = s.id AND m.sent = 0
+                              GROUP BY s.id''')
+            for name, count in cursor.fetchall():
+                METRICS.set('aipaperpush_subscriber_backlog_unsent', count, subscriber=name)
     except Exception as e:
-        logger.error(f"数据库初始化失败: {str(e)}", exc_info=True)
-        raise
-if not success:
-    raise Exception("数据库初始化失败，已达到最大重试次数")
+        logger.warning(f"统计待发送文章数量失败: {str(e)}")
+
+
+def export_metrics():
+    record_backlog_size()
+    if not METRICS_TEXTFILE:
+        return
+    tmp_path = f"{METRICS_TEXTFILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(METRICS.render())
+        os.replace(tmp_path, METRICS_TEXTFILE)
+    except Exception as e:
+        logger.warning(f"写入指标文件失败: {METRICS_TEXTFILE}, 错误: {str(e)}")
+
+
+def record_job(job_name, duration):
+    METRICS.observe('aipaperpush_job_duration_seconds', duration, job=job_name)
+    METRICS.set('aipaperpush_job_last_run_timestamp_seconds', time.time(), job=job_name)
+    export_metrics()
+
+
+# ====== 性能剖析 ======
+
+# 可选值: cpu, memory，多个用逗号分隔；1/true 等同于 cpu
+PROFILE_RUN = os.environ.get('PROFILE_RUN', '').strip().lower()
+PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', '30'))
+
+PROFILE_CPU = False
+PROFILE_MEMORY = False
+
+
+def configure_profiling(cpu=False, memory=False):
+    global PROFILE_CPU, PROFILE_MEMORY
+    modes = {m.strip() for m in PROFILE_RUN.split(',') if m.strip()}
+    PROFILE_CPU = cpu or bool(modes & {'cpu', '1', 'true', 'yes'})
+    PROFILE_MEMORY = memory or 'memory' in modes
+    if PROFILE_CPU or PROFILE_MEMORY:
+        logger.info(f"已启用性能剖析: cpu={PROFILE_CPU}, memory={PROFILE_MEMORY}, 输出目录: {profile_output_dir()}")
+
+
+def profile_output_dir():
+    return os.path.join(os.path.dirname(DB_PATH) or '.', 'profiles')
+
+
+def profile_job(job_name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILE_CPU and not PROFILE_MEMORY:
+                return func(*args, **kwargs)
+            return run_profiled(job_name, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_profiled(job_name, func, *args, **kwargs):
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    output_dir = profile_output_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = os.path.join(output_dir, f"{job_name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+
+    profiler = cProfile.Profile() if PROFILE_CPU else None
+    started_tracemalloc = False
+    if PROFILE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start(25)
+        started_tracemalloc = True
+
+    snapshot = None
+    traced = (0, 0)
+    try:
+        if profiler:
+            profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profiler:
+                profiler.disable()
+            # 先于写CPU剖析结果截取快照，避免统计到剖析器自身的分配
+            if PROFILE_MEMORY and tracemalloc.is_tracing():
+                traced = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, cProfile.__file__),
+                ))
+            if started_tracemalloc:
+                tracemalloc.stop()
+    finally:
+        try:
+            if profiler:
+                profiler.dump_stats(f"{prefix}.prof")
+                with open(f"{prefix}.prof.txt", 'w', encoding='utf-8') as f:
+                    stats = pstats.Stats(profiler, stream=f)
+                    stats.sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+                logger.info(f"CPU剖析结果已写入: {prefix}.prof")
+
+            if snapshot is not None:
+                current, peak = traced
+                top_stats = snapshot.statistics('lineno')[:PROFILE_TOP_N]
+                with open(f"{prefix}-alloc.txt", 'w', encoding='utf-8') as f:
+                    f.write(f"任务: {job_name}\n")
+                    f.write(f"当前分配: {current / 1024:.1f} KiB, 峰值分配: {peak / 1024:.1f} KiB\n\n")
+                    for stat in top_stats:
+                        f.write(f"{stat}\n")
+                logger.info(f"内存分配报告已写入: {prefix}-alloc.txt")
+        except Exception as e:
+            logger.error(f"写入性能剖析结果失败: {str(e)}", exc_info=True)
+
+
+# ====== 租约 ======
+
+_lease_keeper = None
+
+
+def register_leases(names):
+    with DatabaseConnection() as cursor:
+        cursor.executemany("INSERT OR IGNORE INTO leases (name) VALUES (?)", [(n,) for n in names])
 
 
+def claim_next_lease(names, ttl=None, register=False):
+    if not names:
+        return None
+    ttl = ttl or FEED_LEASE_TTL
+    now = time.time()
+    with DatabaseConnection() as cursor:
+        # 立即获取写锁，保证"查询可认领租约 + 写入持有者"在多进程间是原子的
+        cursor.execute("BEGIN IMMEDIATE")
+        if register:
+            cursor.executemany("INSERT OR IGNORE INTO leases (name) VALUES (?)", [(n,) for n in names])
+        placeholders = ','.join('?' * len(names))
+        cursor.execute(
+            f'''SELECT name, owner FROM leases
+                WHERE name IN ({placeholders})
+                  AND (owner IS NULL OR expires_at < ?)
+                  AND (next_due_at IS NULL OR next_due_at <= ?)
+                ORDER BY COALESCE(next_due_at, 0), name LIMIT 1''',
+            list(names) + [now, now]
+        )
+        row = cursor.fetchone()
+        if row is None:
+            METRICS.inc('aipaperpush_lease_claims_total', result='none_available')
+            return None
+        name, previous_owner = row
+        cursor.execute(
+            "UPDATE leases SET owner = ?, acquired_at = ?, renewed_at = ?, expires_at = ? WHERE name = ?",
+            (LEASE_OWNER, now, now, now + ttl, name)
+        )
+    if previous_owner:
+        METRICS.inc('aipaperpush_lease_claims_total', result='recovered')
+        logger.warning(f"接管已过期的租约: {name} (原持有者: {previous_owner})")
+    else:
+        METRICS.inc('aipaperpush_lease_claims_total', result='acquired')
+    ensure_lease_keeper()
+    return name
+
+
+def release_lease(name, next_due_in=None):
+    now = time.time()
+    next_due_at = now + next_due_in if next_due_in else None
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''UPDATE leases SET owner = NULL, expires_at = NULL, last_completed_at = ?, next_due_at = ?
+               WHERE name = ? AND owner = ?''',
+            (now, next_due_at, name, LEASE_OWNER)
+        )
+        released = cursor.rowcount
+    if not released:
+        logger.warning(f"租约已不属于当前工作进程，可能已过期被接管: {name}")
+
+
+def renew_leases(ttl=None):
+    ttl = ttl or FEED_LEASE_TTL
+    now = time.time()
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            "UPDATE leases SET renewed_at = ?, expires_at = ? WHERE owner = ?",
+            (now, now + ttl, LEASE_OWNER)
+        )
+        return cursor.rowcount
+
+
+def release_all_leases():
+    try:
+        with DatabaseConnection() as cursor:
+            cursor.execute("UPDATE leases SET owner = NULL, expires_at = NULL WHERE owner = ?", (LEASE_OWNER,))
+    except Exception as e:
+        logger.warning(f"释放租约失败: {str(e)}")
+
+
+def release_stale_leases():
+    # 启动时释放同一 WORKER_ID 的上一个进程（崩溃或被重启）遗留的租约，无需等待其过期
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''UPDATE leases SET owner = NULL, expires_at = NULL
+               WHERE (owner = ? OR substr(owner, 1, ?) = ?) AND owner != ?''',
+            (WORKER_ID, len(WORKER_ID) + 1, f"{WORKER_ID}#", LEASE_OWNER)
+        )
+        released = cursor.rowcount
+    if released:
+        logger.warning(f"已释放工作进程 {WORKER_ID} 上次运行遗留的 {released} 个租约")
+    return released
+
+
+def _lease_keeper_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            renew_leases()
+        except Exception as e:
+            logger.warning(f"租约续约失败: {str(e)}")
+
+
+def ensure_lease_keeper():
+    global _lease_keeper
+    if _lease_keeper is not None:
+        return
+    _lease_keeper = threading.Thread(
+        target=_lease_keeper_loop,
+        args=(max(FEED_LEASE_TTL / 3.0, 1),),
+        name='lease-keeper',
+        daemon=True
+    )
+    _lease_keeper.start()
+    atexit.register(release_all_leases)
+
+
+def iter_leased_feeds(feeds, next_due_in=None):
+    # next_due_in(url) 返回该源下次可被认领前的秒数，默认使用固定的 FEED_REFRESH_INTERVAL
+    names = {f"feed:{url}": url for url in feeds}
+    register_leases(list(names))
+    while True:
+        name = claim_next_lease(list(names))
+        if name is None:
+            return
+        try:
+            yield names[name]
+        finally:
+            interval = next_due_in(names[name]) if next_due_in else FEED_REFRESH_INTERVAL
+            release_lease(name, next_due_in=interval)
+
+
+def exclusive_job(job_name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not FEED_LEASES:
+                return func(*args, **kwargs)
+            name = f"job:{job_name}"
+            if claim_next_lease([name], register=True) is None:
+                logger.info(f"其他工作进程正在执行任务 {job_name}，本次跳过")
+                return None
+            try:
+                return func(*args, **kwargs)
+            finally:
+                release_lease(name)
+        return wrapper
+    return decorator
+
+
+# ====== 自适应抓取调度 ======
+
+def load_feed_state(feed_url):
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''SELECT etag, last_modified, publish_times, change_times, last_polled_at, unchanged_polls, failures,
+                      override_interval
+               FROM feed_state WHERE feed_url = ?''',
+            (feed_url,)
+        )
+        row = cursor.fetchone()
+    if row is None:
+        row = (None, None, None, None, None, 0, 0, None)
+    etag, last_modified, publish_times, change_times, last_polled_at, unchanged_polls, failures, override_interval = row
+    return {
+        'etag': etag,
+        'last_modified': last_modified,
+        'publish_times': json.loads(publish_times) if publish_times else [],
+        'change_times': json.loads(change_times) if change_times else [],
+        'last_polled_at': last_polled_at,
+        'unchanged_polls': unchanged_polls or 0,
+        'failures': failures or 0,
+        'override_interval': override_interval,
+    }
+
+
+def conditional_headers(state):
+    headers = {}
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    if state.get('last_modified'):
+        headers['If-Modified-Since'] = state['last_modified']
+    return headers
+
+
+def publish_bursts(publish_times, window=FEED_BURST_WINDOW):
+    # arXiv 等源每次更新会带来一批发布时间几乎相同的条目，按时间间隔聚类后取每批的起始时间
+    bursts = []
+    previous = None
+    for ts in sorted(publish_times):
+        if previous is None or ts - previous > window:
+            bursts.append(ts)
+        previous = ts
+    return bursts
+
+
+def change_phase(changes, anchor, cadence, recent=5):
+    # 条目实际出现在源中的时间可能与其发布时间存在固定偏差（如先打时间戳、数小时后才批量发布）。
+    # 每次抓取到新条目都说明更新发生在上次抓取（通常是未更新或304）与本次抓取之间，
+    # 将最近几次的区间折算为相对 anchor 的周期内偏移并求交集，返回 (下界, 上界)，无可用观测时返回 None
+    phase = None
+    for previous, detected in reversed(changes[-recent:]):
+        if detected - previous >= cadence:
+            continue
+        low = (previous - anchor + cadence / 2) % cadence - cadence / 2
+        if phase is not None:
+            # 平移整数个周期，使其与已有区间尽量重叠
+            low += round(((phase[0] + phase[1]) / 2 - low - (detected - previous) / 2) / cadence) * cadence
+        high = low + detected - previous
+        if phase is None:
+            phase = (low, high)
+        elif max(low, phase[0]) < min(high, phase[1]):
+            phase = (max(low, phase[0]), min(high, phase[1]))
+        else:
+            # 与较新的观测矛盾（更新时间已漂移），不再使用更早的观测
+            break
+    return phase
+
+
+def estimate_poll_interval(state, now):
+    if state.get('override_interval'):
+        return state['override_interval']
+    if state.get('failures'):
+        interval = FEED_DEFAULT_POLL_INTERVAL * 2 ** min(state['failures'] - 1, 6)
+        return min(interval, FEED_MAX_POLL_INTERVAL)
+
+    bursts = publish_bursts(state.get('publish_times') or [])
+    changes = state.get('change_times') or []
+    if len(bursts) < 3:
+        # 发布时间不足以推断周期时，用实际抓取到新条目的时间推断
+        bursts = publish_bursts([detected for _, detected in changes])
+    if len(bursts) >= 3:
+        gaps = sorted(b - a for a, b in zip(bursts, bursts[1:]))
+        cadence = gaps[len(gaps) // 2]
+        # 预计更新时间前后各留出一段窗口，窗口内按最小间隔抓取
+        window = min(max(cadence * 0.05, FEED_MIN_POLL_INTERVAL), 7200)
+        offset = change_phase(changes, bursts[-1], cadence)
+        if offset is not None:
+            # 从可能的最早时间开始按窗口探测，未命中时下一次观测会抬高区间下界
+            low, high = offset
+            offset = min((low + high) / 2, low + window)
+        expected = bursts[-1] + cadence + (offset or 0)
+        if expected + window < now:
+            # 错过的更新周期（如周末不更新）顺延到下一个周期
+            expected += -(-(now - expected - window) // cadence) * cadence
+        if now >= expected - window:
+            interval = FEED_MIN_POLL_INTERVAL
+        else:
+            interval = expected - window - now
+    else:
+        interval = FEED_DEFAULT_POLL_INTERVAL * 2 ** min(state.get('unchanged_polls', 0), 4)
+    return min(max(interval, FEED_MIN_POLL_INTERVAL), FEED_MAX_POLL_INTERVAL)
+
+
+def record_feed_poll(feed_url, state, response=None, published_times=(), new_entries=0, failed=False):
+    now = time.time()
+    changed = False
+    if failed:
+        state['failures'] += 1
+        result = 'error'
+    else:
+        state['failures'] = 0
+        if response is not None and response.status_code == 304:
+            result = 'not_modified'
+        else:
+            # 仅在成功解析后保存校验头，避免解析失败的内容被缓存为"未修改"
+            if response is not None:
+                state['etag'] = response.headers.get('ETag')
+                state['last_modified'] = response.headers.get('Last-Modified')
+            changed = new_entries > 0
+            result = 'changed' if changed else 'unchanged'
+            if changed and state.get('last_polled_at'):
+                # 记录 [上次抓取时间, 本次抓取时间]，新条目出现在这一区间内
+                observed = [int(state['last_polled_at']), int(now)]
+                state['change_times'] = (state['change_times'] + [observed])[-FEED_CHANGE_HISTORY:]
+            horizon = now + 86400
+            merged = set(state['publish_times'])
+            merged.update(int(ts) for ts in published_times if ts <= horizon)
+            state['publish_times'] = sorted(merged)[-FEED_PUBLISH_HISTORY:]
+        state['unchanged_polls'] = 0 if changed else state['unchanged_polls'] + 1
+
+    interval = estimate_poll_interval(state, now)
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''INSERT INTO feed_state (feed_url, etag, last_modified, publish_times, change_times, last_polled_at,
+                                       last_changed_at, next_poll_at, poll_interval, unchanged_polls, failures)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (feed_url) DO UPDATE SET
+                   etag = excluded.etag, last_modified = excluded.last_modified,
+                   publish_times = excluded.publish_times, change_times = excluded.change_times,
+                   last_polled_at = excluded.last_polled_at,
+                   last_changed_at = COALESCE(excluded.last_changed_at, feed_state.last_changed_at),
+                   next_poll_at = excluded.next_poll_at, poll_interval = excluded.poll_interval,
+                   unchanged_polls = excluded.unchanged_polls, failures = excluded.failures''',
+            (feed_url, state['etag'], state['last_modified'], json.dumps(state['publish_times']),
+             json.dumps(state['change_times']), now,
+             now if changed else None, now + interval, interval, state['unchanged_polls'], state['failures'])
+        )
+    METRICS.inc('aipaperpush_feed_polls_total', feed=feed_url, result=result)
+    METRICS.set('aipaperpush_feed_poll_interval_seconds', interval, feed=feed_url)
+    logger.debug(f"RSS源 {feed_url} 抓取结果: {result}，下次抓取间隔 {interval:.0f} 秒")
+    return interval
+
+
+def due_feeds(feeds, now=None):
+    now = now or time.time()
+    with DatabaseConnection() as cursor:
+        cursor.execute("SELECT feed_url, next_poll_at FROM feed_state")
+        next_poll = dict(cursor.fetchall())
+    return [url for url in feeds if (next_poll.get(url) or 0) <= now]
+
+
+def feed_next_poll_in(feed_url):
+    with DatabaseConnection() as cursor:
+        cursor.execute("SELECT next_poll_at FROM feed_state WHERE feed_url = ?", (feed_url,))
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return FEED_DEFAULT_POLL_INTERVAL
+    return max(row[0] - time.time(), 0)
+
+
+def set_feed_interval(feed_url, seconds):
+    # seconds 为 0 或 None 时恢复自动学习；修改后立即到期，下一轮抓取按新间隔重新排期
+    override = seconds or None
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''INSERT INTO feed_state (feed_url, override_interval) VALUES (?, ?)
+               ON CONFLICT (feed_url) DO UPDATE SET override_interval = excluded.override_interval, next_poll_at = NULL''',
+            (feed_url, override)
+        )
+        cursor.execute("UPDATE leases SET next_due_at = NULL WHERE name = ?", (f"feed:{feed_url}",))
+    if override:
+        logger.info(f"已为RSS源 {feed_url} 设置固定抓取间隔: {override} 秒")
+    else:
+        logger.info(f"已恢复RSS源 {feed_url} 的自适应抓取间隔")
+
+
+def list_feed_states(feeds):
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''SELECT feed_url, poll_interval, override_interval, next_poll_at, last_polled_at, last_changed_at,
+                      unchanged_polls, failures
+               FROM feed_state'''
+        )
+        states = {row[0]: row[1:] for row in cursor.fetchall()}
+    # 配置中的源在前，其余为已从配置中移除但仍有状态的源
+    urls = list(feeds) + sorted(set(states) - set(feeds))
+    return [(url,) + states.get(url, (None,) * 7) for url in urls]
+
 def get_feed_source(link):
     sources = {
         'arxiv': 'arXiv',
@@ -266,33 +1103,43 @@ def mark_all_unsent_as_sent(max_retries=5, retry_delay=0.5):
             return False
     return False
 
-def send_email_notification(title: str, body: str) -> bool:
-    if not NOTIFIERS:
+def send_email_notification(title: str, body: str, notifiers=None) -> bool:
+    if notifiers is None:
+        notifiers = NOTIFIERS
+    if not notifiers:
         logger.warning("没有配置通知器，无法发送邮件通知")
         logger.warning("请检查环境变量 EMAIL_NOTIFIER 是否正确配置")
         return False
 
+    import apprise
+
     max_tries = int(os.environ.get('MAIL_RETRY', '3'))
     backoff = float(os.environ.get('MAIL_RETRY_BACKOFF', '2'))  
 
     for attempt in range(1, max_tries + 1):
         apobj = apprise.Apprise()
-        for n in NOTIFIERS:
+        for n in notifiers:
             add_result = apobj.add(n)
             if not add_result:
                 logger.error(f"添加通知器失败: {n}")
                 logger.error("请检查邮件服务器配置是否正确")
                 return False
 
+        if attempt > 1:
+            METRICS.inc('aipaperpush_smtp_retries_total')
         try:
-            result = apobj.notify(body=body, title=title, body_format='markdown')
+            with METRICS.timer('aipaperpush_smtp_send_seconds'):
+                result = apobj.notify(body=body, title=title, body_format='markdown')
             if result:
+                METRICS.inc('aipaperpush_smtp_attempts_total', result='success')
                 logger.info(f"邮件发送成功: {title}")
                 return True
             else:
+                METRICS.inc('aipaperpush_smtp_attempts_total', result='failure')
                 logger.warning(f"邮件发送失败(返回 False): {title}")
                 logger.warning("可能的原因: 1) SMTP服务器拒绝连接 2) 认证失败 3) 网络问题")
         except Exception as e:
+            METRICS.inc('aipaperpush_smtp_attempts_total', result='error')
             logger.error(f"邮件发送异常(第{attempt}次): {str(e)}", exc_info=True)
             if "authentication" in str(e).lower():
                 logger.error("认证失败，请检查用户名和密码是否正确")
@@ -348,6 +1195,8 @@ def call_doubao_llm(articles_data):
 """ 
         user_prompt = f"请分析以下{len(articles_data)}篇AI相关文章，并生成邮件标题和内容：\n\n{articles_info}"
         
+        from volcenginesdkarkruntime import Ark
+
         client = Ark(
             api_key=DOUBAO_API_KEY,
             base_url=DOUBAO_ENDPOINT
@@ -355,15 +1204,22 @@ def call_doubao_llm(articles_data):
         
         logger.info(f"正在调用豆包大模型整合{len(articles_data)}篇文章...")
         
-        response = client.chat.completions.create(
-            model=DOUBAO_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000
-        )
+        try:
+            with METRICS.timer('aipaperpush_llm_call_seconds', model=DOUBAO_MODEL):
+                response = client.chat.completions.create(
+                    model=DOUBAO_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=4000
+                )
+        except Exception:
+            METRICS.inc('aipaperpush_llm_calls_total', model=DOUBAO_MODEL, result='error')
+            raise
+        METRICS.inc('aipaperpush_llm_calls_total', model=DOUBAO_MODEL, result='success')
+        record_llm_usage(response)
         
         result = response.choices[0].message.content.strip()
         
@@ -445,6 +1301,8 @@ def call_doubao_llm_batch(articles_data, batch_num, total_batches):
 """ 
         user_prompt = f"请分析以下第{batch_num}批（共{total_batches}批）的{len(articles_data)}篇AI相关文章，并生成邮件标题和内容：\n\n{articles_info}"
         
+        from volcenginesdkarkruntime import Ark
+
         client = Ark(
             api_key=DOUBAO_API_KEY,
             base_url=DOUBAO_ENDPOINT
@@ -452,15 +1310,22 @@ def call_doubao_llm_batch(articles_data, batch_num, total_batches):
         
         logger.info(f"正在调用豆包大模型整合第{batch_num}批{len(articles_data)}篇文章...")
         
-        response = client.chat.completions.create(
-            model=DOUBAO_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=3500  
-        )
+        try:
+            with METRICS.timer('aipaperpush_llm_call_seconds', model=DOUBAO_MODEL):
+                response = client.chat.completions.create(
+                    model=DOUBAO_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=3500
+                )
+        except Exception:
+            METRICS.inc('aipaperpush_llm_calls_total', model=DOUBAO_MODEL, result='error')
+            raise
+        METRICS.inc('aipaperpush_llm_calls_total', model=DOUBAO_MODEL, result='success')
+        record_llm_usage(response)
         
         result = response.choices[0].message.content.strip()
         
@@ -479,6 +1344,15 @@ def call_doubao_llm_batch(articles_data, batch_num, total_batches):
         logger.error(f"调用豆包大模型失败: {str(e)}", exc_info=True)
         return None, None
 
+def record_llm_usage(response):
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    for token_type in ('prompt_tokens', 'completion_tokens'):
+        count = getattr(usage, token_type, None)
+        if count:
+            METRICS.inc('aipaperpush_llm_tokens_total', count, model=DOUBAO_MODEL, type=token_type.split('_')[0])
+
 def test_email_configuration():
     logger.info("开始测试邮件配置...")
     test_title = "邮件配置测试"
@@ -492,16 +1366,63 @@ def test_email_configuration():
         logger.error("❌ 邮件配置测试失败，请检查配置")
         return False
 
+def send_article_batches(articles_data, mark_sent, notifiers=None, batch_size=10):
+    total_batches = (len(articles_data) + batch_size - 1) // batch_size
+    successful_batches = 0
+    
+    for batch_num in range(total_batches):
+        start_idx = batch_num * batch_size
+        end_idx = min(start_idx + batch_size, len(articles_data))
+        batch_articles = articles_data[start_idx:end_idx]
+        
+        logger.info(f"处理第{batch_num + 1}/{total_batches}批，包含{len(batch_articles)}篇文章")
+        
+        if DOUBAO_API_KEY:
+            email_title, email_body = call_doubao_llm_batch(batch_articles, batch_num + 1, total_batches)
+            
+            if email_title and email_body:
+                logger.info(f"发送第{batch_num + 1}批AI整合邮件: {email_title}")
+                success = send_email_notification(email_title, email_body, notifiers)
+            else:
+                logger.warning(f"第{batch_num + 1}批AI整合失败，使用传统批量发送方式")
+                success = send_traditional_batch_limited(batch_articles, batch_num + 1, total_batches, notifiers)
+        else:
+            logger.info(f"未配置AI模型，使用传统批量发送方式处理第{batch_num + 1}批")
+            success = send_traditional_batch_limited(batch_articles, batch_num + 1, total_batches, notifiers)
+
+        if success:
+            successful_batches += 1
+            batch_links = [article[1] for article in batch_articles]  
+            mark_sent(batch_links)
+            logger.info(f"第{batch_num + 1}批邮件发送成功")
+        else:
+            logger.warning(f"第{batch_num + 1}批邮件发送失败，保留 sent=0 以便下次重试")
+        
+        if batch_num < total_batches - 1 and BATCH_SEND_DELAY > 0:
+            time.sleep(BATCH_SEND_DELAY)
+
+    return successful_batches, total_batches
+
+@profile_job('send')
+@exclusive_job('send')
 def ai_integrated_batch_send():
+    start_time = time.time()
     try:
+        score_pending_papers()
         with DatabaseConnection() as cursor:
-            cursor.execute("SELECT title, link, published_time, abstract FROM papers WHERE sent = 0")
+            cursor.execute(
+                '''SELECT title, link, published_time, abstract FROM papers WHERE sent = 0
+                   ORDER BY score DESC, published_time DESC'''
+            )
             articles = cursor.fetchall()
 
         if not articles:
             logger.info("没有新文章需要发送")
             return
 
+        articles, skipped = split_digest(articles)
+        if skipped:
+            logger.info(f"未发送文章超过每期上限 {DIGEST_TOP_K} 篇，按相关性得分跳过 {len(skipped)} 篇")
         logger.info(f"发现{len(articles)}篇未发送文章，准备分批AI整合")
 
         articles_data = []
@@ -510,45 +1431,26 @@ def ai_integrated_batch_send():
             summary = abstract if abstract else title  
             articles_data.append((title, link, summary, published, source))
 
-        batch_size = 10
-        total_batches = (len(articles_data) + batch_size - 1) // batch_size
-        successful_batches = 0
-        
-        for batch_num in range(total_batches):
-            start_idx = batch_num * batch_size
-            end_idx = min(start_idx + batch_size, len(articles_data))
-            batch_articles = articles_data[start_idx:end_idx]
-            
-            logger.info(f"处理第{batch_num + 1}/{total_batches}批，包含{len(batch_articles)}篇文章")
-            
-            if DOUBAO_API_KEY:
-                email_title, email_body = call_doubao_llm_batch(batch_articles, batch_num + 1, total_batches)
-                
-                if email_title and email_body:
-                    logger.info(f"发送第{batch_num + 1}批AI整合邮件: {email_title}")
-                    success = send_email_notification(email_title, email_body)
-                else:
-                    logger.warning(f"第{batch_num + 1}批AI整合失败，使用传统批量发送方式")
-                    success = send_traditional_batch_limited(batch_articles, batch_num + 1, total_batches)
-            else:
-                logger.info(f"未配置AI模型，使用传统批量发送方式处理第{batch_num + 1}批")
-                success = send_traditional_batch_limited(batch_articles, batch_num + 1, total_batches)
-
-            if success:
-                successful_batches += 1
-                batch_links = [article[1] for article in batch_articles]  
-                mark_batch_as_sent(batch_links)
-                logger.info(f"第{batch_num + 1}批邮件发送成功")
-            else:
-                logger.warning(f"第{batch_num + 1}批邮件发送失败，保留 sent=0 以便下次重试")
-            
-            if batch_num < total_batches - 1:
-                time.sleep(2)
+        successful_batches, total_batches = send_article_batches(articles_data, mark_batch_as_sent)
+        if successful_batches and skipped:
+            mark_batch_as_sent([link for _, link, _, _ in skipped], sent=SENT_SKIPPED)
+            METRICS.inc('aipaperpush_digest_capped_total', len(skipped))
         
         logger.info(f"批量发送完成：成功{successful_batches}/{total_batches}批，共处理{len(articles)}篇文章")
+        log_summary(
+            "发送任务汇总",
+            articles=len(articles),
+            skipped=len(skipped),
+            batches=total_batches,
+            successful_batches=successful_batches,
+            ai_enabled=bool(DOUBAO_API_KEY),
+            seconds=round(time.time() - start_time, 3)
+        )
             
     except Exception as e:
         logger.error(f"AI整合批量发送失败: {str(e)}", exc_info=True)
+    finally:
+        record_job('send', time.time() - start_time)
 
 def send_traditional_batch(articles):
     try:
@@ -569,7 +1471,7 @@ def send_traditional_batch(articles):
         logger.error(f"传统批量发送失败: {str(e)}")
         return False
 
-def send_traditional_batch_limited(articles_data, batch_num, total_batches):
+def send_traditional_batch_limited(articles_data, batch_num, total_batches, notifiers=None):
     try:
         key_topics = []
         for article in articles_data:
@@ -609,18 +1511,19 @@ def send_traditional_batch_limited(articles_data, batch_num, total_batches):
         if total_batches > 1:
             email_content += f"\n---\n本次为第{batch_num}批推送，共{total_batches}批。"
         
-        return send_email_notification(email_title, email_content)
+        return send_email_notification(email_title, email_content, notifiers)
         
     except Exception as e:
         logger.error(f"传统批量发送失败: {str(e)}")
         return False
 
-def mark_batch_as_sent(batch_links):
+def mark_batch_as_sent(batch_links, sent=1):
     try:
-        with DatabaseConnection() as cursor:
-            for link in batch_links:
-                cursor.execute("UPDATE papers SET sent = 1 WHERE link = ?", (link,))
-        logger.info(f"成功标记{len(batch_links)}篇文章为已发送")
+        with METRICS.timer('aipaperpush_db_write_seconds', op='mark_sent'):
+            with DatabaseConnection() as cursor:
+                for link in batch_links:
+                    cursor.execute("UPDATE papers SET sent = ? WHERE link = ?", (sent, link))
+        logger.info(f"成功标记{len(batch_links)}篇文章为{'已发送' if sent == 1 else '已跳过'}")
     except Exception as e:
         logger.error(f"标记批次文章失败: {str(e)}", exc_info=True)
 
@@ -770,158 +1673,1261 @@ def validate_rss_feeds(feeds, timeout=10, max_retries=2):
     logger.info(f"RSS源验证完成，有效源数量: {len(valid_feeds)}/{len([f for f in feeds if f and f.strip()])}")
     return valid_feeds
 
+FEED_REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def download_feed(feed_url, timeout=30, headers=None):
+    status = 'error'
+    try:
+        with METRICS.timer('aipaperpush_feed_fetch_seconds', feed=feed_url):
+            response = requests.get(
+                feed_url,
+                timeout=timeout,
+                allow_redirects=True,
+                verify=False,
+                headers=dict(FEED_REQUEST_HEADERS, **(headers or {}))
+            )
+            content = response.content
+        status = str(response.status_code)
+    finally:
+        METRICS.inc('aipaperpush_feed_fetch_total', feed=feed_url, status=status)
+    METRICS.inc('aipaperpush_feed_fetch_bytes_total', len(content), feed=feed_url)
+    return response, content
+
+
+def parse_feed(feed_url, content, response_headers=None):
+    # feedparser 只识别小写的响应头名称
+    headers = {k.lower(): v for k, v in (response_headers or {}).items()}
+    with METRICS.timer('aipaperpush_feed_parse_seconds', feed=feed_url):
+        return feedparser.parse(content, response_headers=headers)
+
+def normalize_entry(entry):
+    title = entry.get('title')
+    link = entry.get('link')
+    if not title or not link:
+        return None
+
+    published_time = None
+    if entry.get('published'):
+        try:
+            # ISO 8601 时间（回填数据）走快速路径，RSS 的 RFC 822 时间交给 dateutil
+            published_time = datetime.fromisoformat(entry.get('published'))
+        except (ValueError, TypeError):
+            published_time = None
+        try:
+            published_time = published_time or parser.parse(entry.get('published'))
+        except (ValueError, TypeError, OverflowError):
+            logger.warning(f"无法解析发布时间: {entry.get('published')}")
+    if published_time:
+        if published_time.tzinfo is None:
+            published_time = published_time.replace(tzinfo=timezone.utc)
+        published_time = published_time.astimezone(timezone.utc)
+
+    abstract = entry.get('summary', '') or entry.get('description', '') or ''
+    if abstract:
+        abstract = re.sub(r'<[^>]+>', '', abstract)  
+        abstract = re.sub(r'\s+', ' ', abstract).strip()  
+
+    return {
+        'id': hashlib.md5(link.encode()).hexdigest(),
+        'title': title,
+        'link': link,
+        'published': published_time,
+        'abstract': abstract,
+    }
+
+
+def tokenize(text):
+    # 与FTS5 unicode61 分词保持一致：按字母数字切分并转为小写
+    return re.findall(r'[^\W_]+', (text or '').lower())
+
+
+def build_keyword_query(keywords, match_abstract=None):
+    if match_abstract is None:
+        match_abstract = MATCH_ABSTRACT
+    phrases = []
+    for keyword in keywords:
+        tokens = tokenize(keyword)
+        if tokens:
+            phrases.append('"' + ' '.join(tokens) + '"')
+    if not phrases:
+        return None
+    columns = '{title abstract}' if match_abstract else 'title'
+    return f"{columns} : ({' OR '.join(phrases)})"
+
+
+def keywords_fingerprint(keywords):
+    payload = json.dumps({'keywords': sorted(set(keywords)), 'match_abstract': MATCH_ABSTRACT})
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def store_entries(cursor, feed_url, normalized_entries, cutoff, refresh=False):
+    # refresh 为真时（快照重处理）用重新解析的字段更新已存在的条目，并与新条目一样按时间阈值参与匹配
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    outcomes = {'duplicate': 0, 'stale': 0}
+    if refresh:
+        outcomes['updated'] = 0
+    fresh = []
+    for item in normalized_entries:
+        published = item['published']
+        fields = (item['title'], item['link'], published.isoformat() if published else None, item['abstract'])
+        cursor.execute(
+            "INSERT OR IGNORE INTO entries (id, title, link, published_time, abstract, feed_url, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (item['id'],) + fields + (feed_url, fetched_at)
+        )
+        if cursor.rowcount == 1:
+            rowid = cursor.lastrowid
+        elif refresh:
+            # 字段未变化时不更新，避免触发器重写全文索引
+            cursor.execute(
+                '''UPDATE entries SET title = ?, link = ?, published_time = ?, abstract = ?
+                   WHERE id = ? AND (title IS NOT ? OR link IS NOT ? OR published_time IS NOT ? OR abstract IS NOT ?)''',
+                fields + (item['id'],) + fields
+            )
+            outcomes['updated'] += cursor.rowcount
+            cursor.execute("SELECT rowid FROM entries WHERE id = ?", (item['id'],))
+            rowid = cursor.fetchone()[0]
+        else:
+            outcomes['duplicate'] += 1
+            continue
+        if not published or published <= cutoff:
+            outcomes['stale'] += 1
+        else:
+            fresh.append((rowid, item))
+    return fresh, outcomes
+
+
+def match_entries(cursor, query, rowids=None, since=None, chunk_size=500, min_rowid=None):
+    if not query:
+        return 0
+    sql = '''INSERT OR IGNORE INTO papers (id, title, link, published_time, abstract)
+             SELECT e.id, e.title, e.link, e.published_time, e.abstract
+             FROM entries_fts JOIN entries e ON e.rowid = entries_fts.rowid
+             WHERE entries_fts MATCH ?'''
+    if rowids is None:
+        params = [query]
+        if since is not None:
+            sql += " AND e.published_time > ?"
+            params.append(since.isoformat())
+        if min_rowid is not None:
+            sql += " AND entries_fts.rowid >= ?"
+            params.append(min_rowid)
+        cursor.execute(sql, params)
+        return max(cursor.rowcount, 0)
+
+    # FTS5 对 rowid IN 列表会逐个rowid重跑一次全文查询，代价随索引增长；
+    # 这里用 rowid 范围约束全文查询，再在连接的 entries 一侧按 IN 列表精确过滤
+    inserted = 0
+    rowids = sorted(rowids)
+    for start in range(0, len(rowids), chunk_size):
+        chunk = rowids[start:start + chunk_size]
+        cursor.execute(
+            sql + f" AND entries_fts.rowid BETWEEN ? AND ? AND e.rowid IN ({','.join('?' * len(chunk))})",
+            [query, chunk[0], chunk[-1]] + chunk
+        )
+        inserted += max(cursor.rowcount, 0)
+    return inserted
+
+
+def rematch_recent_entries(days, keywords=None):
+    if keywords is None:
+        keywords = [k.lower() for k in load_keywords()]
+    query = build_keyword_query(keywords)
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    start = time.time()
+    with METRICS.timer('aipaperpush_db_write_seconds', op='rematch'), DatabaseConnection() as cursor:
+        inserted = match_entries(cursor, query, since=since)
+        set_meta(cursor, 'keywords_fingerprint', keywords_fingerprint(keywords))
+        subscriber_matches = 0
+        cursor.execute("SELECT id FROM subscribers WHERE enabled = 1")
+        for (subscriber_id,) in cursor.fetchall():
+            subscriber_matches += rematch_subscriber(cursor, subscriber_id, since)
+    log_summary(
+        "关键词回溯匹配汇总",
+        days=days,
+        new_articles=inserted,
+        subscriber_matches=subscriber_matches,
+        seconds=round(time.time() - start, 3)
+    )
+    return inserted
+
+
+def check_keywords_changed(keywords):
+    fingerprint = keywords_fingerprint(keywords)
+    with DatabaseConnection() as cursor:
+        previous = get_meta(cursor, 'keywords_fingerprint')
+        if previous is not None and previous != fingerprint:
+            # 待发送文章按新关键词重新评分
+            cursor.execute("UPDATE papers SET score = NULL WHERE sent = 0")
+        if previous is None or previous == fingerprint or KEYWORD_BACKFILL_DAYS <= 0:
+            set_meta(cursor, 'keywords_fingerprint', fingerprint)
+            return
+    logger.info(f"检测到关键词变更，回溯匹配最近 {KEYWORD_BACKFILL_DAYS} 天的已存储条目")
+    rematch_recent_entries(KEYWORD_BACKFILL_DAYS, keywords)
+
+# ====== 相关性排序 ======
+
+# 标题命中的权重倍数（FTS5 bm25() 的列权重），摘要权重为 1
+BM25_TITLE_WEIGHT = 2.0
+
+# sent 取值：0 待发送，1 已发送，2 因超出每期 DIGEST_TOP_K 上限而跳过
+SENT_SKIPPED = 2
+
+
+def score_entries(cursor, rowids, keywords):
+    # 用FTS5内置的 bm25() 在一条查询中为整批候选条目打分，IDF 和文档长度取自 entries 全量索引，
+    # 因此不同批次、不同周期的得分可以相互比较；bm25() 越小越相关，这里取负值
+    scores = dict.fromkeys(rowids, 0.0)
+    query = build_keyword_query(keywords, match_abstract=True)
+    if not query or not scores:
+        return scores
+    start = time.perf_counter()
+    # 用 rowid 范围而不是 IN 列表限定候选条目：IN 列表会使FTS5对每个 rowid 单独执行一次全文查询
+    cursor.execute(
+        '''SELECT rowid, -bm25(entries_fts, ?, 1.0) FROM entries_fts
+           WHERE entries_fts MATCH ? AND rowid BETWEEN ? AND ?''',
+        (BM25_TITLE_WEIGHT, query, min(scores), max(scores))
+    )
+    for rowid, score in cursor.fetchall():
+        if rowid in scores:
+            scores[rowid] = score
+    METRICS.observe('aipaperpush_score_seconds', time.perf_counter() - start)
+    METRICS.inc('aipaperpush_scored_entries_total', len(scores))
+    return scores
+
+
+def score_pending_papers(keywords=None):
+    # 对尚未评分的待发送文章整批评分并保存
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''SELECT p.rowid, e.rowid FROM papers p LEFT JOIN entries e ON e.id = p.id
+               WHERE p.sent = 0 AND p.score IS NULL'''
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        if keywords is None:
+            keywords = [k.lower() for k in load_keywords()]
+        scores = score_entries(cursor, [entry_rowid for _, entry_rowid in rows if entry_rowid is not None], keywords)
+        cursor.executemany(
+            "UPDATE papers SET score = ? WHERE rowid = ?",
+            [(scores.get(entry_rowid, 0.0), paper_rowid) for paper_rowid, entry_rowid in rows]
+        )
+    logger.info(f"已为 {len(rows)} 篇待发送文章计算相关性得分")
+    return len(rows)
+
+
+def split_digest(articles, top_k=None):
+    # articles 已按得分降序排列，返回 (本期推送, 超出上限跳过)
+    top_k = DIGEST_TOP_K if top_k is None else top_k
+    if top_k <= 0 or len(articles) <= top_k:
+        return articles, []
+    return articles[:top_k], articles[top_k:]
+
+
+# ====== 订阅者 ======
+
+SUBSCRIBER_FREQUENCIES = {
+    'hourly': 3600,
+    'daily': 24 * 3600,
+    'weekly': 7 * 24 * 3600,
+}
+
+# 判断发送周期是否到期时允许的提前量，抵消定时任务的调度误差
+SUBSCRIBER_SCHEDULE_SLACK_SECONDS = 300
+
+
+class SubscriberIndex:
+    def __init__(self, keyword_subscribers):
+        # {('deep', 'learning'): {1, 3}, ...}
+        self.keyword_subscribers = keyword_subscribers
+        self.first_tokens = {k[0] for k in keyword_subscribers}
+        self.max_len = max((len(k) for k in keyword_subscribers), default=0)
+
+    @classmethod
+    def load(cls, cursor):
+        cursor.execute('''SELECT k.keyword, k.subscriber_id FROM subscriber_keywords k
+                          JOIN subscribers s ON s.id = k.subscriber_id WHERE s.enabled = 1''')
+        keyword_subscribers = {}
+        for keyword, subscriber_id in cursor.fetchall():
+            phrase = tuple(keyword.split())
+            if phrase:
+                keyword_subscribers.setdefault(phrase, set()).add(subscriber_id)
+        return cls(keyword_subscribers)
+
+    def __bool__(self):
+        return bool(self.keyword_subscribers)
+
+    def match(self, text):
+        tokens = tokenize(text)
+        matched = set()
+        for i, token in enumerate(tokens):
+            if token not in self.first_tokens:
+                continue
+            for n in range(1, min(self.max_len, len(tokens) - i) + 1):
+                subscriber_ids = self.keyword_subscribers.get(tuple(tokens[i:i + n]))
+                if subscriber_ids:
+                    matched |= subscriber_ids
+        return matched
+
+
+def match_subscribers(cursor, subscriber_index, fresh):
+    if not subscriber_index or not fresh:
+        return 0
+    matched_at = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for _, item in fresh:
+        text = item['title']
+        if MATCH_ABSTRACT:
+            text = f"{text} {item['abstract']}"
+        for subscriber_id in subscriber_index.match(text):
+            rows.append((subscriber_id, item['id'], matched_at))
+    if not rows:
+        return 0
+    cursor.executemany(
+        "INSERT OR IGNORE INTO subscriber_matches (subscriber_id, entry_id, matched_at) VALUES (?, ?, ?)",
+        rows
+    )
+    # 重处理时已存在的匹配会被忽略，按实际写入的行数统计
+    inserted = max(cursor.rowcount, 0)
+    if inserted:
+        METRICS.inc('aipaperpush_subscriber_matches_total', inserted)
+    return inserted
+
+
+def rematch_subscriber(cursor, subscriber_id, since):
+    cursor.execute("SELECT keyword FROM subscriber_keywords WHERE subscriber_id = ?", (subscriber_id,))
+    query = build_keyword_query([row[0] for row in cursor.fetchall()])
+    if not query:
+        return 0
+    cursor.execute(
+        '''INSERT OR IGNORE INTO subscriber_matches (subscriber_id, entry_id, matched_at)
+           SELECT ?, e.id, ? FROM entries_fts JOIN entries e ON e.rowid = entries_fts.rowid
+           WHERE entries_fts MATCH ? AND e.published_time > ?''',
+        (subscriber_id, datetime.now(timezone.utc).isoformat(), query, since.isoformat())
+    )
+    return max(cursor.rowcount, 0)
+
+
+def add_subscriber(name, notifier, keywords, frequency='daily', backfill_days=None):
+    if frequency not in SUBSCRIBER_FREQUENCIES:
+        raise ValueError(f"不支持的发送频率: {frequency}，可选值: {', '.join(SUBSCRIBER_FREQUENCIES)}")
+    normalized = sorted({' '.join(tokenize(k)) for k in keywords} - {''})
+    if not normalized:
+        raise ValueError("订阅者至少需要一个有效关键词")
+    if backfill_days is None:
+        backfill_days = KEYWORD_BACKFILL_DAYS
+
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''INSERT INTO subscribers (name, notifier, frequency, enabled, created_at) VALUES (?, ?, ?, 1, ?)
+               ON CONFLICT(name) DO UPDATE SET notifier = excluded.notifier, frequency = excluded.frequency, enabled = 1''',
+            (name, notifier, frequency, datetime.now(timezone.utc).isoformat())
+        )
+        cursor.execute("SELECT id FROM subscribers WHERE name = ?", (name,))
+        subscriber_id = cursor.fetchone()[0]
+        cursor.execute("DELETE FROM subscriber_keywords WHERE subscriber_id = ?", (subscriber_id,))
+        cursor.execute("UPDATE subscriber_matches SET score = NULL WHERE subscriber_id = ? AND sent = 0", (subscriber_id,))
+        cursor.executemany(
+            "INSERT INTO subscriber_keywords (subscriber_id, keyword) VALUES (?, ?)",
+            [(subscriber_id, k) for k in normalized]
+        )
+        backfilled = 0
+        if backfill_days > 0:
+            since = datetime.now(timezone.utc) - timedelta(days=backfill_days)
+            backfilled = rematch_subscriber(cursor, subscriber_id, since)
+    logger.info(f"已保存订阅者: {name}, 关键词 {len(normalized)} 个, 回溯匹配 {backfilled} 篇")
+    return subscriber_id
+
+
+def remove_subscriber(name):
+    with DatabaseConnection() as cursor:
+        cursor.execute("SELECT id FROM subscribers WHERE name = ?", (name,))
+        row = cursor.fetchone()
+        if not row:
+            logger.warning(f"订阅者不存在: {name}")
+            return False
+        cursor.execute("DELETE FROM subscriber_matches WHERE subscriber_id = ?", (row[0],))
+        cursor.execute("DELETE FROM subscriber_keywords WHERE subscriber_id = ?", (row[0],))
+        cursor.execute("DELETE FROM subscribers WHERE id = ?", (row[0],))
+    logger.info(f"已删除订阅者: {name}")
+    return True
+
+
+def list_subscribers():
+    with DatabaseConnection() as cursor:
+        cursor.execute('''SELECT s.name, s.notifier, s.frequency, s.enabled, s.last_sent_at,
+                                 (SELECT COUNT(*) FROM subscriber_keywords k WHERE k.subscriber_id = s.id),
+                                 (SELECT COUNT(*) FROM subscriber_matches m WHERE m.subscriber_id = s.id AND m.sent = 0)
+                          FROM subscribers s ORDER BY s.name''')
+        return cursor.fetchall()
+
+
+def subscriber_due(frequency, last_sent_at, now):
+    if not last_sent_at:
+        return True
+    interval = SUBSCRIBER_FREQUENCIES.get(frequency, SUBSCRIBER_FREQUENCIES['daily'])
+    try:
+        last = datetime.fromisoformat(last_sent_at)
+    except ValueError:
+        return True
+    return (now - last).total_seconds() >= interval - SUBSCRIBER_SCHEDULE_SLACK_SECONDS
+
+
+def mark_subscriber_batch_as_sent(subscriber_id, batch_links, sent=1):
+    try:
+        with METRICS.timer('aipaperpush_db_write_seconds', op='mark_sent'):
+            with DatabaseConnection() as cursor:
+                cursor.executemany(
+                    "UPDATE subscriber_matches SET sent = ? WHERE subscriber_id = ? AND entry_id = ?",
+                    [(sent, subscriber_id, hashlib.md5(link.encode()).hexdigest()) for link in batch_links]
+                )
+    except Exception as e:
+        logger.error(f"标记订阅者批次文章失败: {str(e)}", exc_info=True)
+
+
+def score_subscriber_matches(cursor, subscriber_id):
+    cursor.execute(
+        '''SELECT m.entry_id, e.rowid FROM subscriber_matches m JOIN entries e ON e.id = m.entry_id
+           WHERE m.subscriber_id = ? AND m.sent = 0 AND m.score IS NULL''',
+        (subscriber_id,)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+    cursor.execute("SELECT keyword FROM subscriber_keywords WHERE subscriber_id = ?", (subscriber_id,))
+    keywords = [keyword for (keyword,) in cursor.fetchall()]
+    scores = score_entries(cursor, [rowid for _, rowid in rows], keywords)
+    cursor.executemany(
+        "UPDATE subscriber_matches SET score = ? WHERE subscriber_id = ? AND entry_id = ?",
+        [(scores[rowid], subscriber_id, entry_id) for entry_id, rowid in rows]
+    )
+    return len(rows)
+
+
+@profile_job('send_subscribers')
+@exclusive_job('send_subscribers')
+def send_subscriber_digests(force=False):
+    start_time = time.time()
+    now = datetime.now(timezone.utc)
+    sent_subscribers = 0
+    total_articles = 0
+    try:
+        with DatabaseConnection() as cursor:
+            cursor.execute("SELECT id, name, notifier, frequency, last_sent_at FROM subscribers WHERE enabled = 1")
+            subscribers = cursor.fetchall()
+
+        for subscriber_id, name, notifier, frequency, last_sent_at in subscribers:
+            if not force and not subscriber_due(frequency, last_sent_at, now):
+                continue
+
+            with DatabaseConnection() as cursor:
+                score_subscriber_matches(cursor, subscriber_id)
+                cursor.execute(
+                    '''SELECT e.title, e.link, e.published_time, e.abstract
+                       FROM subscriber_matches m JOIN entries e ON e.id = m.entry_id
+                       WHERE m.subscriber_id = ? AND m.sent = 0 ORDER BY m.score DESC, e.published_time DESC''',
+                    (subscriber_id,)
+                )
+                articles = cursor.fetchall()
+            if not articles:
+                continue
+
+            articles, skipped = split_digest(articles)
+            logger.info(f"订阅者 {name} 有{len(articles) + len(skipped)}篇未发送文章，本期推送{len(articles)}篇")
+            articles_data = [
+                (title, link, abstract if abstract else title, published, get_feed_source(link))
+                for title, link, published, abstract in articles
+            ]
+            successful_batches, _ = send_article_batches(
+                articles_data,
+                lambda links, sid=subscriber_id: mark_subscriber_batch_as_sent(sid, links),
+                notifiers=[notifier]
+            )
+            if successful_batches:
+                sent_subscribers += 1
+                total_articles += len(articles)
+                if skipped:
+                    mark_subscriber_batch_as_sent(subscriber_id, [link for _, link, _, _ in skipped], sent=SENT_SKIPPED)
+                    METRICS.inc('aipaperpush_digest_capped_total', len(skipped))
+                with DatabaseConnection() as cursor:
+                    cursor.execute("UPDATE subscribers SET last_sent_at = ? WHERE id = ?", (now.isoformat(), subscriber_id))
+
+        if subscribers:
+            log_summary(
+                "订阅者发送汇总",
+                subscribers=len(subscribers),
+                sent_subscribers=sent_subscribers,
+                articles=total_articles,
+                seconds=round(time.time() - start_time, 3)
+            )
+    except Exception as e:
+        logger.error(f"订阅者批量发送失败: {str(e)}", exc_info=True)
+    finally:
+        record_job('send_subscribers', time.time() - start_time)
+
+def normalize_entries(entries):
+    normalized = []
+    for entry in entries:
+        item = normalize_entry(entry)
+        if item is not None:
+            normalized.append(item)
+    return normalized
+
+
+def ingest_feed_entries(feed_url, normalized, keyword_query, subscriber_index=None, skipped=0, now=None,
+                        refresh=False, not_before=None):
+    # skipped 为缺少标题或链接、未能规范化的条目数；now 为判断新旧的参考时间，默认为当前时间；
+    # refresh 见 store_entries，已入队或已发送的文章和订阅匹配不会重复加入；
+    # not_before 为新文章发布时间的下限，早于它的条目一律视为旧条目
+    outcomes = {'stale': 0, 'unmatched': 0, 'duplicate': 0, 'inserted': 0, 'error': skipped}
+    subscriber_matches = 0
+
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(hours=NEW_ITEM_THRESHOLD_HOURS)
+    if not_before is not None:
+        cutoff = max(cutoff, not_before)
+    with METRICS.timer('aipaperpush_db_write_seconds', op='insert'), DatabaseConnection() as cursor:
+        fresh, stored = store_entries(cursor, feed_url, normalized, cutoff, refresh=refresh)
+        outcomes.update(stored)
+        outcomes['inserted'] = match_entries(cursor, keyword_query, rowids=[rowid for rowid, _ in fresh])
+        subscriber_matches = match_subscribers(cursor, subscriber_index, fresh)
+    outcomes['unmatched'] = len(fresh) - outcomes['inserted']
+
+    for outcome, count in outcomes.items():
+        if count:
+            METRICS.inc('aipaperpush_feed_entries_total', count, feed=feed_url, outcome=outcome)
+    logger.debug("RSS源 %s 新增 %d 篇符合条件的文章", feed_url, outcomes['inserted'])
+    outcomes['subscriber_matches'] = subscriber_matches
+    return outcomes
+
+def process_feed(feed_url, keyword_query, subscriber_index=None):
+    feed_start = time.time()
+    # 自适应调度时带上缓存校验头，并在结束后（无论成功与否）记录本次抓取结果以安排下次抓取
+    state = load_feed_state(feed_url) if ADAPTIVE_POLLING else None
+    response = None
+    outcomes = None
+    normalized = []
+    try:
+        try:
+            response, content = download_feed(feed_url, headers=conditional_headers(state) if state else None)
+        except RequestException as fetch_error:
+            logger.error(f"下载RSS源失败: {feed_url}, 错误: {str(fetch_error)}")
+            return None
+        if response.status_code == 304:
+            logger.debug(f"RSS源未更新 (304): {feed_url}")
+            outcomes = {'stale': 0, 'unmatched': 0, 'duplicate': 0, 'inserted': 0, 'error': 0,
+                        'subscriber_matches': 0, 'entries': 0, 'not_modified': 1}
+            log_summary("RSS源汇总", feed=feed_url, seconds=round(time.time() - feed_start, 3), **outcomes)
+            return outcomes
+        if response.status_code >= 400:
+            logger.warning(f"下载RSS源失败: {feed_url}, 状态码: {response.status_code}")
+            return None
+
+        if FEED_SNAPSHOTS:
+            # 在解析前保存，解析或过滤出错时仍可从快照恢复
+            try:
+                store_snapshot(feed_url, content, response.headers)
+            except Exception as snapshot_error:
+                logger.warning(f"保存RSS快照失败: {feed_url}, 错误: {str(snapshot_error)}")
+
+        try:
+            feed = parse_feed(feed_url, content, response.headers)
+        except Exception as parse_error:
+            logger.error(f"feedparser解析失败: {feed_url}, 错误: {str(parse_error)}")
+            return None
+            
+        if feed.bozo != 0:
+            logger.warning(f"解析RSS失败: {feed_url}, 错误: {feed.bozo_exception}")
+            return None
+        
+        normalized = normalize_entries(feed.entries)
+        outcomes = ingest_feed_entries(feed_url, normalized, keyword_query, subscriber_index,
+                                       skipped=len(feed.entries) - len(normalized))
+        outcomes['entries'] = len(feed.entries)
+        log_summary(
+            "RSS源汇总",
+            feed=feed_url,
+            seconds=round(time.time() - feed_start, 3),
+            **outcomes
+        )
+        return outcomes
+    except Exception as e:
+        logger.error(f"处理RSS源时出错: {feed_url}, 错误: {str(e)}")
+        outcomes = None
+        return None
+    finally:
+        if state is not None:
+            try:
+                record_feed_poll(
+                    feed_url, state,
+                    response=response,
+                    published_times=[item['published'].timestamp() for item in normalized if item['published']],
+                    new_entries=sum((outcomes or {}).get(k, 0) for k in ('stale', 'unmatched', 'inserted')),
+                    failed=outcomes is None
+                )
+            except Exception as e:
+                logger.error(f"更新RSS源抓取调度失败: {feed_url}, 错误: {str(e)}")
+
+# ====== RSS原始快照 ======
+
+# 快照中保留的、影响feedparser解析结果的响应头
+SNAPSHOT_HEADERS = ('content-type', 'content-location', 'content-language')
+
+
+def snapshot_dir():
+    return SNAPSHOT_DIR or os.path.join(os.path.dirname(DB_PATH) or '.', 'snapshots')
+
+
+def snapshot_path(digest):
+    return os.path.join(snapshot_dir(), 'objects', digest[:2], f"{digest}.gz")
+
+
+def store_snapshot(feed_url, content, response_headers=None):
+    # 按内容的 SHA-256 寻址：相同内容只保存一份，同一源重复抓到相同内容时只更新 last_seen_at
+    digest = hashlib.sha256(content).hexdigest()
+    path = snapshot_path(digest)
+    if os.path.exists(path):
+        METRICS.inc('aipaperpush_snapshot_writes_total', result='deduplicated')
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        METRICS.inc('aipaperpush_snapshot_writes_total', result='stored')
+    headers = {k.lower(): v for k, v in (response_headers or {}).items() if k.lower() in SNAPSHOT_HEADERS}
+    now = time.time()
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            '''INSERT INTO feed_snapshots (feed_url, sha256, size, headers, first_seen_at, last_seen_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (feed_url, sha256) DO UPDATE SET last_seen_at = excluded.last_seen_at''',
+            (feed_url, digest, len(content), json.dumps(headers), now, now)
+        )
+    return digest
+
+
+def load_snapshot(digest):
+    with gzip.open(snapshot_path(digest), 'rb') as f:
+        return f.read()
+
+
+def prune_snapshots(retention_days=None):
+    retention_days = SNAPSHOT_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0
+    with DatabaseConnection() as cursor:
+        cursor.execute("DELETE FROM feed_snapshots WHERE last_seen_at < ?", (time.time() - retention_days * 86400,))
+        deleted = cursor.rowcount
+        cursor.execute("SELECT DISTINCT sha256 FROM feed_snapshots")
+        referenced = {digest for (digest,) in cursor.fetchall()}
+
+    # 删除不再被引用的快照文件；最近一小时内写入的文件可能尚未登记，跳过
+    removed = 0
+    grace_cutoff = time.time() - 3600
+    objects_dir = os.path.join(snapshot_dir(), 'objects')
+    for root, _, files in os.walk(objects_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.split('.')[0] in referenced or os.path.getmtime(path) > grace_cutoff:
+                continue
+            os.remove(path)
+            removed += 1
+    logger.info(f"已清理 {deleted} 条过期快照记录，删除 {removed} 个快照文件")
+    return deleted
+
+
+def _init_snapshot_worker():
+    # 工作进程中没有日志监听线程，改为直接写标准错误
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.root.handlers = [handler]
+
+
+def bounded_map(executor, func, items, limit):
+    # 按顺序返回结果并限制在途任务数量，解析速度快于单进程写库时不会在内存中堆积结果；executor 为空时在当前进程执行
+    if executor is None:
+        yield from map(func, items)
+        return
+    pending = collections.deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def parse_snapshot(snapshot):
+    # 在工作进程中执行：读取快照、解析并规范化条目，返回结果由主进程统一写库
+    feed_url, digest, headers, first_seen_at = snapshot
+    try:
+        feed = parse_feed(feed_url, load_snapshot(digest), json.loads(headers or '{}'))
+    except Exception as e:
+        return feed_url, digest, first_seen_at, None, 0, str(e)
+    if feed.bozo != 0:
+        return feed_url, digest, first_seen_at, None, 0, str(feed.bozo_exception)
+    normalized = normalize_entries(feed.entries)
+    return feed_url, digest, first_seen_at, normalized, len(feed.entries) - len(normalized), None
+
+
+def reprocess_snapshots(days=None, feed_url=None, workers=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    start_time = time.time()
+    conditions, params = [], []
+    if days:
+        conditions.append("last_seen_at >= ?")
+        params.append(time.time() - days * 86400)
+    if feed_url:
+        conditions.append("feed_url = ?")
+        params.append(feed_url)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    with DatabaseConnection() as cursor:
+        cursor.execute(
+            f"SELECT feed_url, sha256, headers, first_seen_at FROM feed_snapshots {where} ORDER BY first_seen_at",
+            params
+        )
+        snapshots = cursor.fetchall()
+        subscriber_index = SubscriberIndex.load(cursor)
+        pruned_before = get_meta(cursor, 'pruned_before')
+    # 早于数据保留期的已发送文章和条目可能已被清理，重新处理会把它们当作新文章再次推送；
+    # 跳过保留期之前首次抓取的快照，其余快照中发布时间早于保留期的条目也只作为旧条目入库
+    cutoffs = [datetime.fromisoformat(pruned_before)] if pruned_before else []
+    if RETENTION_DAYS > 0:
+        cutoffs.append(retention_cutoff(RETENTION_DAYS))
+    not_before = max(cutoffs) if cutoffs else None
+    expired = 0
+    if not_before is not None:
+        kept = [snapshot for snapshot in snapshots if snapshot[3] >= not_before.timestamp()]
+        expired = len(snapshots) - len(kept)
+        snapshots = kept
+    if expired:
+        logger.info(f"跳过 {expired} 个早于数据保留期（{not_before.isoformat()}）的快照")
+    if not snapshots:
+        logger.info("没有可重新处理的快照")
+        return None
+
+    keywords = [k.lower() for k in load_keywords()]
+    keyword_query = build_keyword_query(keywords)
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"开始重新处理 {len(snapshots)} 个快照，工作进程数: {workers}")
+
+    totals = {'snapshots': len(snapshots), 'expired_snapshots': expired, 'failed_snapshots': 0, 'entries': 0,
+              'inserted': 0, 'updated': 0, 'subscriber_matches': 0}
+    # 解析和规范化在进程池中并行执行，写库只在主进程中按顺序进行，避免多进程争用写锁
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_snapshot_worker) if workers > 1 else None
+    try:
+        for url, digest, first_seen_at, normalized, skipped, error in bounded_map(
+                executor, parse_snapshot, snapshots, workers * 2):
+            if error is not None:
+                totals['failed_snapshots'] += 1
+                logger.warning(f"快照解析失败: {url} ({digest[:12]}), 错误: {error}")
+                continue
+            # 以快照的首次抓取时间判断新旧，结果与当时实时抓取一致；已入库的条目按重新解析的字段更新并重新匹配
+            outcomes = ingest_feed_entries(
+                url, normalized, keyword_query, subscriber_index, skipped=skipped,
+                now=datetime.fromtimestamp(first_seen_at, timezone.utc), refresh=True, not_before=not_before
+            )
+            totals['entries'] += len(normalized) + skipped
+            totals['inserted'] += outcomes['inserted']
+            totals['updated'] += outcomes['updated']
+            totals['subscriber_matches'] += outcomes['subscriber_matches']
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    score_pending_papers(keywords)
+
+    log_summary("快照重处理汇总", seconds=round(time.time() - start_time, 3), **totals)
+    return totals
+
+
+# ====== 历史数据回填 ======
+
+BACKFILL_JSONL_SUFFIXES = ('.jsonl', '.json')
+BACKFILL_FEED_SUFFIXES = ('.xml', '.rss', '.atom')
+
+# 工作进程内的回填参数（订阅者索引、分类过滤、起始日期），由进程池初始化函数设置
+_backfill_context = {}
+
+
+def _init_backfill_worker(context):
+    _init_snapshot_worker()
+    _backfill_context.update(context)
+
+
+def open_dump(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def arxiv_record_to_entry(record):
+    # arXiv 元数据快照（arxiv-metadata-oai-snapshot.json，每行一条）转换为RSS条目的字段，再交给 normalize_entry
+    published = record.get('update_date')
+    versions = record.get('versions') or []
+    if versions and versions[0].get('created'):
+        try:
+            published = email.utils.parsedate_to_datetime(versions[0]['created']).isoformat()
+        except (TypeError, ValueError):
+            pass
+    return {
+        'title': ' '.join((record.get('title') or '').split()),
+        'link': f"https://arxiv.org/abs/{record['id']}" if record.get('id') else None,
+        'published': published,
+        'summary': record.get('abstract') or '',
+    }
+
+
+def arxiv_category_match(categories, wanted):
+    # wanted 中的 cs 同时匹配 cs.AI、cs.LG 等子分类
+    for category in (categories or '').split():
+        for prefix in wanted:
+            if category == prefix or category.startswith(prefix + '.'):
+                return True
+    return False
+
+
+def iter_backfill_tasks(paths, batch_size):
+    # JSONL 按行分块读取，RSS/Atom 文件整文件作为一个任务，由工作进程自行读取，主进程内存占用与文件大小无关
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for file_path in files:
+            name = file_path[:-3] if file_path.endswith('.gz') else file_path
+            if name.endswith(BACKFILL_JSONL_SUFFIXES):
+                with open_dump(file_path) as f:
+                    batch = []
+                    for line in f:
+                        if line.strip():
+                            batch.append(line)
+                        if len(batch) >= batch_size:
+                            yield 'arxiv', file_path, batch
+                            batch = []
+                    if batch:
+                        yield 'arxiv', file_path, batch
+            elif name.endswith(BACKFILL_FEED_SUFFIXES):
+                yield 'feed', file_path, file_path
+            else:
+                logger.warning(f"跳过无法识别的回填文件: {file_path}")
+
+
+def parse_backfill_task(task):
+    # 在工作进程中执行：解析、规范化、按起始日期过滤并匹配订阅者，返回结果由主进程批量写库
+    kind, source, payload = task
+    context = _backfill_context
+    skipped = filtered = 0
+    try:
+        if kind == 'arxiv':
+            entries = []
+            wanted = context.get('categories')
+            for line in payload:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if wanted and not arxiv_category_match(record.get('categories'), wanted):
+                    filtered += 1
+                    continue
+                entries.append(arxiv_record_to_entry(record))
+        else:
+            with open_dump(payload) as f:
+                feed = parse_feed(source, f.read())
+            if feed.bozo != 0 and not feed.entries:
+                return source, [], 0, 0, str(feed.bozo_exception)
+            entries = feed.entries
+    except Exception as e:
+        return source, [], 0, 0, str(e)
+
+    normalized = normalize_entries(entries)
+    skipped += len(entries) - len(normalized)
+    since = context.get('since')
+    if since is not None:
+        kept = [item for item in normalized if item['published'] and item['published'] >= since]
+        filtered += len(normalized) - len(kept)
+        normalized = kept
+
+    subscriber_index = context.get('subscriber_index')
+    rows = []
+    for item in normalized:
+        subscriber_ids = ()
+        if subscriber_index:
+            text = f"{item['title']} {item['abstract']}" if MATCH_ABSTRACT else item['title']
+            subscriber_ids = tuple(subscriber_index.match(text))
+        rows.append((item, subscriber_ids))
+    return source, rows, skipped, filtered, None
+
+
+def bulk_store_entries(cursor, source, rows, keyword_query, sent=0):
+    # 单写入者批量写入：一个立即写事务内 executemany 插入，再按新增 rowid 范围做一次FTS关键词匹配
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM entries")
+    last_rowid = cursor.fetchone()[0]
+    cursor.executemany(
+        "INSERT OR IGNORE INTO entries (id, title, link, published_time, abstract, feed_url, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(item['id'], item['title'], item['link'], item['published'].isoformat() if item['published'] else None,
+          item['abstract'], source, fetched_at) for item, _ in rows]
+    )
+    cursor.execute("SELECT id FROM entries WHERE rowid > ?", (last_rowid,))
+    new_ids = {entry_id for (entry_id,) in cursor.fetchall()}
+
+    matched = match_entries(cursor, keyword_query, min_rowid=last_rowid + 1)
+    if sent and matched:
+        cursor.execute(
+            "UPDATE papers SET sent = ? WHERE sent = 0 AND id IN (SELECT id FROM entries WHERE rowid > ?)",
+            (sent, last_rowid)
+        )
+    subscriber_rows = [
+        (subscriber_id, item['id'], fetched_at, sent)
+        for item, subscriber_ids in rows if item['id'] in new_ids
+        for subscriber_id in subscriber_ids
+    ]
+    subscriber_matches = 0
+    if subscriber_rows:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO subscriber_matches (subscriber_id, entry_id, matched_at, sent) VALUES (?, ?, ?, ?)",
+            subscriber_rows
+        )
+        subscriber_matches = cursor.rowcount
+    return len(new_ids), matched, subscriber_matches
+
+
+def backfill_dumps(paths, categories=None, since=None, enqueue=False, workers=None, batch_size=2000):
+    from concurrent.futures import ProcessPoolExecutor
+
+    start_time = time.time()
+    keywords = [k.lower() for k in load_keywords()]
+    keyword_query = build_keyword_query(keywords)
+    with DatabaseConnection() as cursor:
+        subscriber_index = SubscriberIndex.load(cursor)
+    context = {
+        'categories': [c.strip() for c in (categories or []) if c.strip()],
+        'since': since,
+        'subscriber_index': subscriber_index,
+    }
+    # 默认把历史文章记为已发送，只用于检索、回溯匹配和去重；--enqueue 时加入待发送队列
+    sent = 0 if enqueue else 1
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"开始回填历史数据: {', '.join(paths)}，工作进程数: {workers}")
+
+    totals = {'tasks': 0, 'failed_tasks': 0, 'records': 0, 'skipped': 0, 'filtered': 0,
+              'inserted': 0, 'duplicate': 0, 'matched': 0, 'subscriber_matches': 0}
+    tasks = iter_backfill_tasks(paths, batch_size)
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_backfill_worker, initargs=(context,))
+    else:
+        executor = None
+        _backfill_context.update(context)
+
+    try:
+        for source, rows, skipped, filtered, error in bounded_map(executor, parse_backfill_task, tasks, workers * 2):
+            totals['tasks'] += 1
+            if error is not None:
+                totals['failed_tasks'] += 1
+                logger.warning(f"回填文件解析失败: {source}, 错误: {error}")
+                continue
+            totals['records'] += len(rows) + skipped + filtered
+            totals['skipped'] += skipped
+            totals['filtered'] += filtered
+            if not rows:
+                continue
+            with METRICS.timer('aipaperpush_db_write_seconds', op='backfill'), DatabaseConnection() as cursor:
+                inserted, matched, subscriber_matches = bulk_store_entries(cursor, source, rows, keyword_query, sent)
+            totals['inserted'] += inserted
+            totals['duplicate'] += len(rows) - inserted
+            totals['matched'] += matched
+            totals['subscriber_matches'] += subscriber_matches
+            if totals['tasks'] % 50 == 0:
+                logger.info(f"回填进度: 已读取 {totals['records']} 条，新增 {totals['inserted']} 条，命中关键词 {totals['matched']} 条")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    if enqueue:
+        score_pending_papers(keywords)
+
+    duration = time.time() - start_time
+    log_summary(
+        "历史回填汇总",
+        enqueue=enqueue,
+        records_per_second=round(totals['records'] / duration, 1) if duration else None,
+        seconds=round(duration, 3),
+        **totals
+    )
+    return totals
+
+
+# ====== 数据保留与维护 ======
+
+def archive_dir():
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(DB_PATH) or '.', 'archive')
+
+
+def database_file_sizes():
+    sizes = {}
+    for name, path in (('db', DB_PATH), ('wal', f"{DB_PATH}-wal")):
+        sizes[name] = os.path.getsize(path) if os.path.exists(path) else 0
+        METRICS.set('aipaperpush_db_size_bytes', sizes[name], file=name)
+    return sizes
+
+
+def archive_and_delete(table, columns, where, params, archive_path=None):
+    # 分块归档并删除，每块一个短事务，避免长时间持有写锁阻塞抓取；先写入归档再提交删除
+    deleted = 0
+    out = None
+    try:
+        while True:
+            with DatabaseConnection() as cursor:
+                cursor.execute(
+                    f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE {where} ORDER BY rowid LIMIT ?",
+                    list(params) + [RETENTION_CHUNK_SIZE]
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                if archive_path:
+                    if out is None:
+                        out = gzip.open(archive_path, 'wt', encoding='utf-8')
+                    for row in rows:
+                        out.write(json.dumps(dict(zip(columns, row[1:])), ensure_ascii=False) + '\n')
+                    out.flush()
+                cursor.executemany(f"DELETE FROM {table} WHERE rowid = ?", [(row[0],) for row in rows])
+            deleted += len(rows)
+    finally:
+        if out is not None:
+            out.close()
+    if deleted:
+        METRICS.inc('aipaperpush_retention_deleted_total', deleted, table=table)
+    return deleted
+
+
+def retention_cutoff(retention_days):
+    # 保留期不短于新文章时间阈值，否则被删除的条目再次出现在RSS源中时会被当作新文章重复推送
+    retention_days = max(retention_days, NEW_ITEM_THRESHOLD_HOURS / 24.0 + 1)
+    return datetime.now(timezone.utc) - timedelta(days=retention_days)
+
+
+def prune_old_rows(retention_days, archive=None):
+    if archive is None:
+        archive = ARCHIVE_BEFORE_DELETE
+    cutoff = retention_cutoff(retention_days).isoformat()
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    target = archive_dir() if archive else None
+    if target:
+        os.makedirs(target, exist_ok=True)
+
+    def segment(table):
+        return os.path.join(target, f"{table}-{stamp}.jsonl.gz") if target else None
+
+    deleted = {}
+    # 只清理已发送（或已跳过）的文章，待发送的文章及其条目无论多旧都保留；
+    # 文章与条目按同一时间（抓取时间）和同样的排除条件判断，只随条目一起删除，
+    # 否则保留下来的条目会被回溯匹配重新加入待发送队列
+    deleted['papers'] = archive_and_delete(
+        'papers', ['id', 'title', 'link', 'published_time', 'abstract', 'sent', 'score'],
+        '''sent != 0 AND COALESCE(
+               (SELECT COALESCE(e.fetched_at, e.published_time) FROM entries e WHERE e.id = papers.id),
+               published_time) < ?
+           AND id NOT IN (SELECT entry_id FROM subscriber_matches WHERE sent = 0)''',
+        [cutoff], segment('papers')
+    )
+    deleted['subscriber_matches'] = archive_and_delete(
+        'subscriber_matches', ['subscriber_id', 'entry_id', 'matched_at', 'sent', 'score'],
+        "sent != 0 AND matched_at < ?", [cutoff]
+    )
+    deleted['entries'] = archive_and_delete(
+        'entries', ['id', 'title', 'link', 'published_time', 'abstract', 'feed_url', 'fetched_at'],
+        '''COALESCE(fetched_at, published_time) < ?
+           AND id NOT IN (SELECT id FROM papers WHERE sent = 0)
+           AND id NOT IN (SELECT entry_id FROM subscriber_matches WHERE sent = 0)''',
+        [cutoff], segment('entries')
+    )
+    # 记录已清理到的时间点（包括手动指定的保留天数），快照重处理不会把早于它的条目当作新文章
+    with DatabaseConnection() as cursor:
+        set_meta(cursor, 'pruned_before', max(cutoff, get_meta(cursor, 'pruned_before', '')))
+    return deleted
+
+
+@profile_job('maintenance')
+@exclusive_job('maintenance')
+def run_maintenance(retention_days=None, full_vacuum=False):
+    start_time = time.time()
+    if retention_days is None:
+        retention_days = RETENTION_DAYS
+    before = database_file_sizes()
+    deleted = {}
+    analyzed = False
+    try:
+        if os.path.isdir(snapshot_dir()):
+            prune_snapshots()
+        if retention_days > 0:
+            deleted = prune_old_rows(retention_days)
+            if deleted['entries']:
+                # 大量删除后合并FTS5索引段，回收已删除条目占用的索引空间
+                with DatabaseConnection() as cursor:
+                    cursor.execute("INSERT INTO entries_fts (entries_fts) VALUES ('optimize')")
+
+        with DatabaseConnection() as cursor:
+            cursor.execute("PRAGMA auto_vacuum")
+            auto_vacuum = cursor.fetchone()[0]
+            last_analyze_at = float(get_meta(cursor, 'last_analyze_at', '0'))
+
+        with DatabaseConnection() as cursor:
+            if full_vacuum or auto_vacuum != 2:
+                # 早期创建的数据库未开启增量 auto_vacuum，需要一次完整 VACUUM 完成转换
+                logger.info("执行完整 VACUUM（并开启增量 auto_vacuum）")
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                cursor.execute("VACUUM")
+            else:
+                cursor.execute("PRAGMA incremental_vacuum")
+                cursor.fetchall()
+
+            if time.time() - last_analyze_at >= ANALYZE_INTERVAL_DAYS * 86400:
+                cursor.execute("ANALYZE")
+                set_meta(cursor, 'last_analyze_at', str(time.time()))
+                analyzed = True
+            else:
+                cursor.execute("PRAGMA optimize")
+
+        with DatabaseConnection() as cursor:
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            cursor.fetchall()
+
+        after = database_file_sizes()
+        log_summary(
+            "数据库维护汇总",
+            retention_days=retention_days,
+            analyzed=analyzed,
+            db_bytes_before=before['db'],
+            db_bytes_after=after['db'],
+            wal_bytes_before=before['wal'],
+            wal_bytes_after=after['wal'],
+            seconds=round(time.time() - start_time, 3),
+            **{f"deleted_{table}": count for table, count in deleted.items()}
+        )
+    except Exception as e:
+        logger.error(f"数据库维护失败: {str(e)}", exc_info=True)
+    finally:
+        record_job('maintenance', time.time() - start_time)
+
+
 # ====== 主任务 ======
-def fetch_and_push():
-    import time
+def fetch_and_push(force_all=False):
+    # 自适应调度时只处理已到期的源；失败的源由调度退避重试，不再单独预先验证。
+    # 到期检查放在剖析范围之外，守护进程空转的调度周期不会产生剖析文件
+    feeds = due_feeds(RSS_FEEDS) if ADAPTIVE_POLLING and not force_all else list(RSS_FEEDS)
+    if not feeds:
+        logger.debug("没有到期的RSS源，跳过本轮抓取")
+        return
+    fetch_feeds(feeds)
+
+
+@profile_job('fetch')
+def fetch_feeds(feeds):
     start_time = time.time()
-    
     logger.info("开始执行RSS获取和推送任务")
     logger.info(f"任务开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     keywords = [k.lower() for k in load_keywords()]
     logger.info(f"Running fetch... keywords={keywords}")
+    keyword_query = build_keyword_query(keywords)
+    check_keywords_changed(keywords)
+    with DatabaseConnection() as cursor:
+        subscriber_index = SubscriberIndex.load(cursor)
+    if subscriber_index:
+        logger.info(f"已加载订阅者关键词倒排索引: {len(subscriber_index.keyword_subscribers)} 个关键词")
     
-    logger.info("开始验证RSS源...")
-    valid_feeds = validate_rss_feeds(RSS_FEEDS)
-    logger.info(f"已过滤无效RSS源，剩余: {len(valid_feeds)}/{len(RSS_FEEDS)}")
-    if not valid_feeds:
-        logger.error("所有RSS源均无效，请检查rsshub服务和网络连接")
-    
-    logger.info(f"开始处理 {len(valid_feeds)} 个有效的RSS源")
+    if FEED_LEASES:
+        # 逐个认领RSS源（未启用自适应调度时在处理前单独验证），其余源留给其他工作进程
+        logger.info(f"已启用租约分片抓取，工作进程: {LEASE_OWNER}")
+        feeds_to_process = iter_leased_feeds(feeds, next_due_in=feed_next_poll_in if ADAPTIVE_POLLING else None)
+        valid_feeds = []
+    elif ADAPTIVE_POLLING:
+        logger.info(f"已到期待抓取的RSS源: {len(feeds)}/{len(RSS_FEEDS)}")
+        valid_feeds = feeds
+        feeds_to_process = list(valid_feeds)
+    else:
+        logger.info("开始验证RSS源...")
+        valid_feeds = validate_rss_feeds(RSS_FEEDS)
+        logger.info(f"已过滤无效RSS源，剩余: {len(valid_feeds)}/{len(RSS_FEEDS)}")
+        if not valid_feeds:
+            logger.error("所有RSS源均无效，请检查rsshub服务和网络连接")
+        
+        logger.info(f"开始处理 {len(valid_feeds)} 个有效的RSS源")
+        feeds_to_process = list(valid_feeds)
     
     total_articles = 0
     processed_articles = 0
     new_articles = 0
+    failed_feeds = 0
+    not_modified_feeds = 0
     
-    for i, feed_url in enumerate(valid_feeds, 1):
-        try:
-            logger.info(f"正在解析RSS源 ({i}/{len(valid_feeds)}): {feed_url}")
-            
-            try:
-                feed = feedparser.parse(feed_url)
-            except Exception as parse_error:
-                logger.error(f"feedparser解析失败: {feed_url}, 错误: {str(parse_error)}")
+    for i, feed_url in enumerate(feeds_to_process, 1):
+        if FEED_LEASES:
+            if not ADAPTIVE_POLLING and not validate_rss_feeds([feed_url]):
+                failed_feeds += 1
                 continue
-                
-            if feed.bozo != 0:
-                logger.warning(f"解析RSS失败: {feed_url}, 错误: {feed.bozo_exception}")
-                continue
-            
-            entries = feed.entries
-            total_articles += len(entries)
-            logger.info(f"从 {feed_url} 获取到 {len(entries)} 篇文章")
-            logger.info(f"进度: 已处理RSS源 {i}/{len(valid_feeds)}, 累计文章 {total_articles} 篇")
-            
-            for j, entry in enumerate(entries, 1):
-                processed_articles += 1
-
-                pattern = re.compile(r'\b(' + '|'.join(re.escape(k) for k in keywords) + r')\b', re.IGNORECASE)
-                
-                published_time = None
-                if hasattr(entry, 'published'):
-                    try:
-                        published_time = parser.parse(entry.published)
-                    except (ValueError, TypeError):
-                        logger.warning(f"无法解析发布时间: {entry.published}")
-                
-                threshold_seconds = NEW_ITEM_THRESHOLD_HOURS * 3600
-                try:
-                    current_time = datetime.now(timezone.utc)
-                    if published_time and published_time.tzinfo is None:
-                        published_time = published_time.replace(tzinfo=timezone.utc)
-                    if not published_time or (current_time - published_time).total_seconds() >= threshold_seconds:
-                         continue
-                except Exception as e:
-                    logger.error(f"处理文章时间时出错: {str(e)}")
-                    continue
-                
-                if 'title' in entry and pattern.search(entry.title):
-                    logger.info(f"文章符合条件: {entry.title}")
-                    try:
-                        notify_after_insert = False
-                        with DatabaseConnection() as cursor:
-                            cursor.execute("SELECT id FROM papers WHERE link = ?", (entry.link,))
-                            existing = cursor.fetchone()
-                            if existing:
-                                logger.info(f"文章已存在于数据库: {entry.title}")
-                                continue
-                            
-                            logger.info(f"发现新文章，准备插入数据库: {entry.title}")
-
-                            article_id = hashlib.md5(entry.link.encode()).hexdigest()
-                            
-                            abstract = getattr(entry, 'summary', '') or getattr(entry, 'description', '') or ''
-                            if abstract:
-                                abstract = re.sub(r'<[^>]+>', '', abstract)  
-                                abstract = re.sub(r'\s+', ' ', abstract).strip()  
-
-                            try:
-                                logger.info(f"开始插入文章到数据库: {entry.title}")
-                                cursor.execute(
-                                    "INSERT INTO papers (id, title, link, published_time, abstract) VALUES (?, ?, ?, ?, ?)",
-                                    (article_id, entry.title, entry.link, published_time.isoformat() if published_time else None, abstract)
-                                )
-                                logger.info(f"文章已成功存储到数据库: {entry.title}")
-                                new_articles += 1
-                                notify_after_insert = True
-                            except sqlite3.IntegrityError:
-                                logger.warning(f"文章已存在于数据库 (主键冲突): {entry.title}")
-                            except Exception as e:
-                                logger.error(f"插入文章到数据库失败: {str(e)}", exc_info=True)
-                                raise
-                        if notify_after_insert:
-                            logger.info(f"新文章已存储，等待批量处理: {entry.title}")
-                    except sqlite3.IntegrityError:
-                        continue  
-                    except Exception as e:
-                        logger.error(f"处理文章时出错: {entry.title}, 错误: {str(e)}")
-                else:
-                    pass
-        except Exception as e:
-            logger.error(f"处理RSS源时出错: {feed_url}, 错误: {str(e)}")
+            valid_feeds.append(feed_url)
+        logger.debug(f"正在解析RSS源 ({i}): {feed_url}")
+        outcomes = process_feed(feed_url, keyword_query, subscriber_index)
+        if outcomes is None:
+            failed_feeds += 1
             continue
+        total_articles += outcomes['entries']
+        processed_articles += outcomes['entries']
+        new_articles += outcomes['inserted']
+        not_modified_feeds += outcomes.get('not_modified', 0)
+
+    # 本轮新入库的候选文章整批评分
+    try:
+        score_pending_papers(keywords)
+    except Exception as e:
+        logger.error(f"相关性评分失败: {str(e)}", exc_info=True)
     
     end_time = time.time()
     duration = end_time - start_time
     logger.info(f"RSS获取和推送任务完成")
-    logger.info(f"任务结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"任务耗时: {duration:.2f}秒")
-    logger.info(f"处理统计: 总文章数 {total_articles}, 新文章数 {new_articles}, 处理文章数 {processed_articles}")
+    log_summary(
+        "抓取任务汇总",
+        feeds=len(RSS_FEEDS),
+        valid_feeds=len(valid_feeds),
+        failed_feeds=failed_feeds,
+        not_modified_feeds=not_modified_feeds,
+        total_articles=total_articles,
+        processed_articles=processed_articles,
+        new_articles=new_articles,
+        seconds=round(duration, 3)
+    )
+    record_job('fetch', duration)
+
+
+def run_daemon(skip_test_email=False):
+    import schedule
 
-
-
-if __name__ == "__main__":
     print("=== 应用程序启动 ===")
-    print("开始初始化日志系统...")
     required_files = [KEYWORDS_FILE]
     for file in required_files:
         if not os.path.exists(file):
             print(f"警告: 必要文件不存在 - {file}")
-    db_dir = os.path.dirname(DB_PATH)
-    if db_dir and not os.path.exists(db_dir):
-        print(f"警告: 数据库目录不存在 - {db_dir}")
-        os.makedirs(db_dir, exist_ok=True)
-        print(f"已自动创建数据库目录 - {db_dir}")
-        
-        try:
-            import stat
-            os.chmod(db_dir, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
-            print(f"已设置数据库目录权限: {db_dir}")
-        except Exception as dir_perm_e:
-            print(f"设置数据库目录权限失败: {str(dir_perm_e)}")
-            try:
-                os.chmod(db_dir, 0o755)  # 备用权限设置
-                print(f"已使用备用权限设置数据库目录: {db_dir}")
-            except Exception as dir_perm_e2:
-                print(f"备用目录权限设置也失败: {str(dir_perm_e2)}")
     print("初始化检查完成")
     print(f"环境变量 LOG_LEVEL: {os.environ.get('LOG_LEVEL')}")
     print(f"通知器配置: {NOTIFIERS}")
     print(f"数据库路径: {DB_PATH}")
 
     print(f"RSS源数量: {len(RSS_FEEDS)}")
+
+    # HTTP指标端点只在常驻进程中启动，一次性命令通过 METRICS_TEXTFILE 导出
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT)
+        except Exception as e:
+            logger.error(f"指标端点启动失败: {str(e)}")
     
-    if NOTIFIERS:
+    if NOTIFIERS and not skip_test_email:
         test_email_configuration()
     
     try:
@@ -938,8 +2944,18 @@ if __name__ == "__main__":
             schedule.every(1).hours.do(summarize_and_send_batch)
             logger.info("已安排每小时批量发送任务")
         
-        schedule.every(1).hours.do(fetch_and_push)
-        logger.info("已安排每小时RSS抓取任务")
+        if ADAPTIVE_POLLING:
+            schedule.every(FEED_SCHEDULER_TICK).seconds.do(fetch_and_push)
+            logger.info(f"已安排自适应RSS抓取任务，每 {FEED_SCHEDULER_TICK} 秒检查到期的RSS源")
+        else:
+            schedule.every(1).hours.do(fetch_and_push)
+            logger.info("已安排每小时RSS抓取任务")
+
+        schedule.every(1).hours.do(send_subscriber_digests)
+        logger.info("已安排每小时订阅者发送检查任务")
+
+        schedule.every().day.at(MAINTENANCE_TIME).do(run_maintenance)
+        logger.info(f"已安排每日 {MAINTENANCE_TIME} 执行数据库维护任务")
         
         logger.info(f"当前已安排的定时任务数量: {len(schedule.jobs)}")
         for job in schedule.jobs:
@@ -949,10 +2965,9 @@ if __name__ == "__main__":
         
         logger.info("启动时立即执行一次批量发送任务")
         summarize_and_send_batch()
+        send_subscriber_digests()
         
         logger.info("进入定时任务循环...")
-        loop_count = 0
-        last_job_check = 0
         while True:
             pending_jobs = [job for job in schedule.jobs if job.should_run]
             if pending_jobs:
@@ -962,9 +2977,177 @@ if __name__ == "__main__":
             
             schedule.run_pending()
             time.sleep(10)
-            loop_count += 1
-                     
 
     except Exception as e:
         print(f"程序执行失败: {str(e)}")
         raise
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(
+        prog='fetch_and_push.py',
+        description='AI论文/文章抓取与邮件推送工具，不指定子命令时以守护进程方式运行'
+    )
+    arg_parser.add_argument('--profile', action='store_true',
+                            help='使用cProfile剖析抓取/发送任务（等同于 PROFILE_RUN=cpu）')
+    arg_parser.add_argument('--profile-memory', action='store_true',
+                            help='使用tracemalloc记录内存分配（等同于 PROFILE_RUN=memory）')
+    subparsers = arg_parser.add_subparsers(dest='command')
+
+    fetch_parser = subparsers.add_parser('fetch', help='执行一次RSS抓取并入库后退出')
+    fetch_parser.add_argument('--all', action='store_true',
+                              help='忽略自适应调度，抓取全部RSS源')
+    send_parser = subparsers.add_parser('send', help='执行一次未发送文章的批量推送后退出')
+    send_parser.add_argument('--force', action='store_true',
+                             help='忽略订阅者的发送频率，立即推送所有订阅者的未发送文章')
+
+    daemon_parser = subparsers.add_parser('run-daemon', help='启动定时任务循环（默认）')
+    daemon_parser.add_argument('--skip-test-email', action='store_true',
+                               help='启动时不发送测试邮件')
+
+    subparsers.add_parser('test-email', help='发送一封测试邮件后退出')
+
+    subscriber_parser = subparsers.add_parser('subscriber', help='管理订阅者')
+    subscriber_commands = subscriber_parser.add_subparsers(dest='subscriber_command', required=True)
+    add_parser = subscriber_commands.add_parser('add', help='新增或更新订阅者')
+    add_parser.add_argument('name', help='订阅者名称')
+    add_parser.add_argument('--notifier', required=True, help='Apprise通知地址，如 mailto://...')
+    add_parser.add_argument('--keywords', default='', help='逗号分隔的关键词')
+    add_parser.add_argument('--keywords-file', help='关键词文件，每行一个')
+    add_parser.add_argument('--frequency', default='daily', choices=sorted(SUBSCRIBER_FREQUENCIES),
+                            help='发送频率')
+    remove_parser = subscriber_commands.add_parser('remove', help='删除订阅者')
+    remove_parser.add_argument('name', help='订阅者名称')
+    subscriber_commands.add_parser('list', help='列出订阅者')
+
+    feeds_parser = subparsers.add_parser('feeds', help='查看或调整RSS源的抓取间隔')
+    feeds_commands = feeds_parser.add_subparsers(dest='feeds_command', required=True)
+    feeds_commands.add_parser('list', help='列出各RSS源的抓取间隔和下次抓取时间')
+    interval_parser = feeds_commands.add_parser('set-interval', help='为RSS源设置固定抓取间隔')
+    interval_parser.add_argument('url', help='RSS源地址')
+    interval_parser.add_argument('seconds', type=int, help='抓取间隔（秒），0 表示恢复自适应')
+
+    maintenance_parser = subparsers.add_parser('maintenance', help='执行一次数据库维护（归档清理、VACUUM、ANALYZE）')
+    maintenance_parser.add_argument('--retention-days', type=int, default=None,
+                                    help='覆盖 RETENTION_DAYS，归档并删除早于该天数的已发送数据')
+    maintenance_parser.add_argument('--vacuum', action='store_true',
+                                    help='执行完整 VACUUM 而不是增量 VACUUM')
+
+    reprocess_parser = subparsers.add_parser('reprocess', help='从已保存的RSS原始快照重新解析入库（无需联网）')
+    reprocess_parser.add_argument('--days', type=float, default=None,
+                                  help='只处理最近N天内抓取到的快照，默认处理全部')
+    reprocess_parser.add_argument('--feed', default=None, help='只处理指定RSS源的快照')
+    reprocess_parser.add_argument('--workers', type=int, default=None,
+                                  help='解析快照的进程数，默认等于CPU核数')
+
+    backfill_parser = subparsers.add_parser('backfill', help='从本地数据文件批量回填历史文章（arXiv元数据JSONL、RSS/Atom文件）')
+    backfill_parser.add_argument('paths', nargs='+', help='数据文件或目录，支持 .gz 压缩')
+    backfill_parser.add_argument('--categories', default='',
+                                 help='逗号分隔的arXiv分类过滤，如 cs.AI,cs.LG 或 cs')
+    backfill_parser.add_argument('--since', default=None, help='只回填该日期之后发布的文章，如 2024-01-01')
+    backfill_parser.add_argument('--enqueue', action='store_true',
+                                 help='将命中关键词的历史文章加入待发送队列（默认记为已发送）')
+    backfill_parser.add_argument('--workers', type=int, default=None,
+                                 help='解析进程数，默认等于CPU核数')
+    backfill_parser.add_argument('--batch-size', type=int, default=2000, help='每批写入的条目数')
+
+    rematch_parser = subparsers.add_parser('rematch', help='按当前关键词重新匹配已存储的条目（无需联网）')
+    rematch_parser.add_argument('--days', type=int, default=KEYWORD_BACKFILL_DAYS or 7,
+                                help='回溯的天数（按发布时间）')
+    return arg_parser
+
+
+def run_subscriber_command(args):
+    if args.subscriber_command == 'add':
+        keywords = [k.strip() for k in args.keywords.split(',') if k.strip()]
+        if args.keywords_file:
+            with open(args.keywords_file, 'r', encoding='utf-8') as f:
+                keywords.extend(line.strip() for line in f if line.strip())
+        try:
+            add_subscriber(args.name, args.notifier, keywords, args.frequency)
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+        return 0
+    if args.subscriber_command == 'remove':
+        return 0 if remove_subscriber(args.name) else 1
+    for name, notifier, frequency, enabled, last_sent_at, keyword_count, unsent in list_subscribers():
+        status = '启用' if enabled else '停用'
+        masked = re.sub(r'(://[^:/@]+:)[^@/?]+@', r'\1***@', notifier)
+        print(f"{name}\t{frequency}\t{status}\t关键词 {keyword_count}\t待发送 {unsent}\t上次发送 {last_sent_at or '-'}\t{masked}")
+    return 0
+
+
+def format_timestamp(ts):
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M') if ts else '-'
+
+
+def run_feeds_command(args):
+    if args.feeds_command == 'set-interval':
+        if args.seconds < 0:
+            logger.error("抓取间隔不能为负数")
+            return 1
+        set_feed_interval(args.url, args.seconds)
+        return 0
+    for url, interval, override, next_poll_at, last_polled_at, last_changed_at, unchanged, failures in list_feed_states(RSS_FEEDS):
+        if override:
+            mode = f"固定 {override:.0f}s"
+        elif interval:
+            mode = f"自适应 {interval:.0f}s"
+        else:
+            mode = '未抓取'
+        print(f"{url}\t{mode}\t下次抓取 {format_timestamp(next_poll_at)}\t上次抓取 {format_timestamp(last_polled_at)}"
+              f"\t上次更新 {format_timestamp(last_changed_at)}\t连续无更新 {unchanged or 0}\t连续失败 {failures or 0}")
+    return 0
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    command = args.command or 'run-daemon'
+
+    bootstrap()
+    configure_profiling(cpu=args.profile, memory=args.profile_memory)
+
+    if command == 'fetch':
+        fetch_and_push(force_all=args.all)
+        return 0
+    if command == 'send':
+        summarize_and_send_batch()
+        send_subscriber_digests(force=args.force)
+        return 0
+    if command == 'subscriber':
+        return run_subscriber_command(args)
+    if command == 'feeds':
+        return run_feeds_command(args)
+    if command == 'test-email':
+        return 0 if test_email_configuration() else 1
+    if command == 'maintenance':
+        run_maintenance(retention_days=args.retention_days, full_vacuum=args.vacuum)
+        return 0
+    if command == 'reprocess':
+        reprocess_snapshots(days=args.days, feed_url=args.feed, workers=args.workers)
+        return 0
+    if command == 'backfill':
+        since = None
+        if args.since:
+            since = parser.parse(args.since)
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+        backfill_dumps(
+            args.paths,
+            categories=args.categories.split(','),
+            since=since,
+            enqueue=args.enqueue,
+            workers=args.workers,
+            batch_size=args.batch_size
+        )
+        return 0
+    if command == 'rematch':
+        rematch_recent_entries(args.days)
+        return 0
+    run_daemon(skip_test_email=getattr(args, 'skip_test_email', False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())